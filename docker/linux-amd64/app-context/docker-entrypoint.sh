@@ -20,5 +20,8 @@ fi
 
 echo "Using ${bee_workers} worker(s)..."
 
+# 停机时等待进行中的请求（包括流式对话）结束的最长时间（秒），默认为 300
+bee_graceful_shutdown_timeout="${bee_graceful_shutdown_timeout:-300}"
+
 # 执行主服务，替换当前进程
-exec uvicorn main:app --host 0.0.0.0 --port 80 --workers "$bee_workers"
\ No newline at end of file
+exec uvicorn main:app --host 0.0.0.0 --port 80 --workers "$bee_workers" --timeout-graceful-shutdown "$bee_graceful_shutdown_timeout"
\ No newline at end of file
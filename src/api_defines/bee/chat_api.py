@@ -1,36 +1,50 @@
 
-from fastapi.responses import StreamingResponse
-from httpx_sse import aconnect_sse
+import json
+import logging
+from contextlib import aclosing
 
+import httpx
+import orjson
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from services import coalesce_service, env_service, retry_service, session_service
+from services.disconnect_service import DisconnectWatcher
 from services.http_service import http_clients
+from services.latency_service import ChatLatencyTimer
 from services.log_service import logger
-from services.module_load_service import load_chat_api
-from services.sse_service import get_sse_message
+from services.module_load_service import get_api_module
+from services.result_service import to_json_response
+from services.sse_service import SSEDecoder, encode_sse_data, get_sse_message, sse_done_message
+from services.upstream_service import upstream_pools
 
 from .models.chat_args import ChatArgs as BeeChatArgs,ChatStreamOptionsModel as BeeChatStreamOptionsModel
 from .models.chat_result import ChatResult as BeeChatResult
+from .models.chat_result import ChatStreamChunkResult as BeeChatStreamChunkResult
 from .models.error_result import APIErrorResult
-import asyncio
 
-chat_api=None
-chat_api_initialized = False
-chat_api_lock = asyncio.Lock()
 
-async def chat(args:BeeChatArgs,token: str)->BeeChatResult | StreamingResponse | APIErrorResult:
+async def chat(args:BeeChatArgs,token: str,session_id: str | None=None,endpoint: str="chat",request: Request | None=None)->BeeChatResult | Response | APIErrorResult:
+    """
+    对话请求，语音识别（asr）、语音合成（tts）同样使用对话格式，通过 endpoint 区分，
+    使用各自的客户端；配置了 bee_asr_url、bee_tts_url 或路由时使用各自的上游地址，否则使用对话的上游地址。
+    asr、tts 使用 provider 的 chat_api 模块，使用各自的上游地址时 provider 同样按 asr、tts 的路由和 bee_{接口}_provider_type 选择
+    """
     response_error_text=""
-    global chat_api, chat_api_initialized
+    response=None
     try:
-        if not chat_api_initialized:
-            async with chat_api_lock:
-                if not chat_api_initialized:
-                    chat_api = load_chat_api()
-                    await chat_api.init() # type: ignore
-                    chat_api_initialized=True
-                    
-        request_url=await chat_api.get_request_url(args) # type: ignore
+        pool_endpoint=endpoint if upstream_pools.is_configured(endpoint,args.model) else "chat"
+        chat_api=await get_api_module("chat",args.model,pool_endpoint)
+        # 同一会话的请求固定路由到同一个上游地址，请求头中没有会话标识时使用 user 字段
+        with session_service.session_scope(session_id or args.user):
+            if pool_endpoint=="chat":
+                request_url=await chat_api.get_request_url(args) # type: ignore
+            else:
+                request_url=upstream_pools.select(pool_endpoint,args.model,args.messages)
         request_headers =await chat_api.get_request_headers(token) # type: ignore
         request_args =await chat_api.get_request_args(pre_process_args(args)) # type: ignore
-        client=http_clients.chat_client
+        client=http_clients.get_client(endpoint,args.model)
+        upstream_pool=upstream_pools.get_pool(pool_endpoint,args.model)
         
         logger.info(f"发起问答对话请求,地址:{request_url}\n")
         logger.debug(f"请求头参数：{request_headers}\n")
@@ -38,42 +52,106 @@ async def chat(args:BeeChatArgs,token: str)->BeeChatResult | StreamingResponse |
         logger.debug(f"修改后请求参数：{request_args}\n")
         
         if args.stream:
+            # 合并窗口，大于 0 时把该时间内连续到达的增量内容合并为一个 chunk 发送
+            coalesce_seconds=float(env_service.get_chat_coalesce_ms())/1000
+            coalesce_max_tokens=int(env_service.get_chat_coalesce_max_tokens())
+            debug_enabled=logger.isEnabledFor(logging.DEBUG)
+
+            async def iter_stream_chunks(chunks,timer:ChatLatencyTimer):
+                # 直接在字节上切分 SSE 事件，不逐行解码为字符串，[DONE] 返回 None
+                decoder=SSEDecoder()
+                async for chunk in chunks:
+                    for data in decoder.feed(chunk):
+                        if data==b"[DONE]":
+                            logger.debug("停止流式输出\n")
+                            yield None
+                            continue
+
+                        line_data=json.loads(data)
+                        if debug_enabled:
+                            logger.debug(f"原始返回参数：{line_data}\n")
+                        new_line_data=await chat_api.get_request_stream_chunk_result(line_data) # type: ignore
+                        # 在 chunk 到达时计时，上游没有返回性能指标时填入用量统计
+                        timer.chunk_received(new_line_data)
+                        yield new_line_data
+
+            def encode_stream_chunk(new_line_data:BeeChatStreamChunkResult|None)->bytes:
+                if new_line_data is None:
+                    return sse_done_message
+                # 与 to_json_response 一致，不校验构建的 chunk 中字段类型可能与声明不一致，不输出序列化警告
+                new_line_data_json=new_line_data.model_dump_json(warnings=False)
+                if debug_enabled:
+                    logger.debug(f"修改后返回参数：{new_line_data_json}\n")
+                return encode_sse_data(new_line_data_json.encode())
+
+            def get_stream_error_line(e:Exception)->str:
+                # 响应头已经发送，出错时以一条 SSE 错误消息结束流式响应，不让异常中断分块传输
+                if isinstance(e,httpx.HTTPStatusError):
+                    msg=e.response.text
+                    logger.info("请求失败，错误信息："+msg)
+                    api_error_json = APIErrorResult(code="000",message=msg).model_dump_json()
+                    return get_sse_message(api_error_json)
+                # 重试后仍然连接失败、上游返回的内容无法解析等
+                error_text=f"问答对话流式请求发生错误，异常类型：{str(type(e))},异常信息：{e}"
+                logger.error(error_text)
+                return get_sse_message(APIErrorResult(message=error_text).model_dump_json())
+
             # 定义流式生成器
             async def stream_generator():
-                async with aconnect_sse(
-                    client,
-                    "POST",
-                    url=request_url,
-                    headers=request_headers,
-                    json=request_args,
-                ) as event_source:
-                    if event_source.response.status_code != 200:
-                        msg=(await event_source.response.aread()).decode(encoding="utf-8",errors="ignore")
-                        logger.info("请求失败，错误信息："+msg)
-                        api_error_json = APIErrorResult(code="000",message=msg).model_dump_json()
-                        error_line=get_sse_message(api_error_json)
-                        yield error_line
-                    else:
-                        async for line in event_source.aiter_sse():
-                            if line.data is None:
-                                continue
-                            
-                            # [DONE]
-                            if line.data=="[DONE]":
-                                yield get_sse_message(line.data)
-                                logger.debug("停止流式输出\n")
-                                continue
-                                
-                            line_data=line.json()
-                            logger.debug(f"原始返回参数：{line_data}\n")
-                            new_line_data=await chat_api.get_request_stream_chunk_result(line_data) # type: ignore
-                            new_line_data_json=new_line_data.model_dump_json()
-                            logger.debug(f"修改后返回参数：{new_line_data_json}\n")
-                            new_line=get_sse_message(new_line_data_json)
-                            yield new_line
-                        
+                # 客户端断开连接时立即中断上游的流式响应
+                async with DisconnectWatcher(request):
+                    try:
+                        timer=ChatLatencyTimer(endpoint,args.model,stream=True)
+                        async with aclosing(retry_service.aiter_bytes_with_retry(
+                            upstream_pool,
+                            client,
+                            request_url,
+                            request_headers,
+                            request_args,
+                        )) as chunks, aclosing(iter_stream_chunks(chunks,timer)) as results:
+                            if coalesce_seconds<=0:
+                                async for new_line_data in results:
+                                    yield encode_stream_chunk(new_line_data)
+                            else:
+                                async with aclosing(coalesce_service.coalesce(results,coalesce_seconds,coalesce_max_tokens)) as batches:
+                                    async for batch in batches:
+                                        yield b"".join(encode_stream_chunk(new_line_data) for new_line_data in coalesce_service.merge_stream_chunks(batch))
+                        timer.finish()
+                    except Exception as e:
+                        yield get_stream_error_line(e)
+
+            async def passthrough_stream_generator():
+                async with DisconnectWatcher(request):
+                    try:
+                        # 直通时不解析内容，只统计收到第一段内容的耗时作为首 token 延迟
+                        timer=ChatLatencyTimer(endpoint,args.model,stream=True)
+                        async with aclosing(retry_service.aiter_bytes_with_retry(
+                            upstream_pool,
+                            client,
+                            request_url,
+                            request_headers,
+                            request_args,
+                        )) as chunks:
+                            if coalesce_seconds<=0:
+                                async for chunk in chunks:
+                                    if timer.first_token_time is None:
+                                        timer.tokens_received()
+                                    yield chunk
+                            else:
+                                # 直通时不解析内容，只把合并窗口内到达的字节一次发送
+                                async with aclosing(coalesce_service.coalesce(chunks,coalesce_seconds,coalesce_max_tokens)) as batches:
+                                    async for batch in batches:
+                                        if timer.first_token_time is None:
+                                            timer.tokens_received()
+                                        yield b"".join(batch)
+                        timer.finish()
+                    except Exception as e:
+                        yield get_stream_error_line(e)
+
+            # provider 的流式内容已经是 OpenAI 格式时，直接转发上游的 SSE 字节，不逐块解析 JSON 和创建 pydantic 对象
+            passthrough=getattr(chat_api,"stream_passthrough",False) and env_service.get_chat_stream_passthrough()=="true"
             return StreamingResponse(
-                content=stream_generator(),
+                content=passthrough_stream_generator() if passthrough else stream_generator(),
                 status_code=200,
                 headers={
                     "proxy-server":"bee"
@@ -81,20 +159,31 @@ async def chat(args:BeeChatArgs,token: str)->BeeChatResult | StreamingResponse |
                 media_type="text/event-stream"
             )
         else:
-            response = await client.post(
-                url=request_url,
-                headers=request_headers,
-                json=request_args)
-            response_error_text=",响应信息："+response.text
-            
-            response.raise_for_status()
-            result_data = response.json()
-            logger.debug(f"原始返回参数：{result_data}\n")
+            timer=ChatLatencyTimer(endpoint,args.model,stream=False)
+            async with DisconnectWatcher(request) as watcher:
+                response = await retry_service.post_with_retry(upstream_pool,client,request_url,request_headers,request_args)
+            if watcher.disconnected:
+                return APIErrorResult(message="客户端已断开连接")
+            timer.tokens_received()
+            result_data = orjson.loads(response.content)
+            debug_enabled=logger.isEnabledFor(logging.DEBUG)
+            if debug_enabled:
+                logger.debug(f"原始返回参数：{result_data}\n")
             result =await chat_api.get_request_result(result_data) # type: ignore
-            logger.debug(f"修改后返回参数：{result.model_dump_json()}\n")
+            # 上游没有返回性能指标时填入 Bee 计时的结果
+            timer.usage_received(result.usage)
+            timer.finish()
+            if debug_enabled:
+                logger.debug(f"修改后返回参数：{result.model_dump_json(warnings=False)}\n")
             logger.info("问答对话请求成功")
-            return result
+            # 直接序列化结果，不再经过 response_model 重新校验
+            return to_json_response(result)
     except Exception as e:
+        # 只在出错时解码响应内容，成功时不再把整个响应转换为字符串
+        if response is not None:
+            response_error_text=",响应信息："+response.text
+        elif isinstance(e,httpx.HTTPStatusError):
+            response_error_text=",响应信息："+e.response.text
         error_text=f"问答对话请求发生错误，异常类型：{str(type(e))},异常信息：{e} {response_error_text}"
         logger.error(error_text)
         return APIErrorResult(message=error_text)
@@ -1,28 +1,25 @@
+import logging
 
+import httpx
+import orjson
+from fastapi.responses import Response
+
+from services import hedge_service
 from services.http_service import http_clients
 from services.log_service import logger
-from services.module_load_service import load_embeddings_api
+from services.module_load_service import get_api_module
+from services.result_service import to_json_response
+from services.upstream_service import upstream_pools
 
 from .models.embeddings_args import EmbeddingsArgs as BeeEmbeddingsArgs
 from .models.embeddings_result import EmbeddingsResult as BeeEmbeddingsResult
 from .models.error_result import APIErrorResult
-import asyncio
 
-embeddings_api=None
-embeddings_api_initialized = False
-embeddings_api_lock = asyncio.Lock()
 
-async def embeddings(args:BeeEmbeddingsArgs,token: str)->BeeEmbeddingsResult | APIErrorResult:
+async def embeddings(args:BeeEmbeddingsArgs,token: str)->BeeEmbeddingsResult | Response | APIErrorResult:
     response=None
-    global embeddings_api, embeddings_api_initialized
     try:
-        if not embeddings_api_initialized:
-            async with embeddings_api_lock:
-                if not embeddings_api_initialized:
-                    embeddings_api = load_embeddings_api()
-                    await embeddings_api.init() # type: ignore
-                    embeddings_api_initialized=True
-                    
+        embeddings_api=await get_api_module("embeddings",args.model)
             
         request_url=await embeddings_api.get_request_url(args) # type: ignore
         request_headers =await embeddings_api.get_request_headers(token) # type: ignore
@@ -33,19 +30,26 @@ async def embeddings(args:BeeEmbeddingsArgs,token: str)->BeeEmbeddingsResult | A
         logger.debug(f"原始请求参数：{args.model_dump_json()}\n")
         logger.debug(f"修改后请求参数：{request_args}\n")
         
-        client=http_clients.embeddings_client
-        response = await client.post(url=request_url,headers=request_headers,json=request_args)
-        response.raise_for_status()
-        result_data = response.json()
-        logger.debug(f"原始返回参数：{result_data}\n")
+        client=http_clients.get_client("embeddings",args.model)
+        upstream_pool=upstream_pools.get_pool("embeddings",args.model)
+        response = await hedge_service.post_with_hedge(upstream_pool,client,request_url,request_headers,request_args)
+        result_data = orjson.loads(response.content)
+        # 向量结果较大，只在 debug 级别格式化返回内容
+        debug_enabled=logger.isEnabledFor(logging.DEBUG)
+        if debug_enabled:
+            logger.debug(f"原始返回参数：{result_data}\n")
         result =await embeddings_api.get_request_result(result_data) # type: ignore
-        logger.debug(f"修改后返回参数：{result.model_dump_json()}\n")
+        if debug_enabled:
+            logger.debug(f"修改后返回参数：{result.model_dump_json(warnings=False)}\n")
         logger.info("文本嵌入请求成功")
-        return result
+        # 直接序列化结果，不再经过 response_model 重新校验
+        return to_json_response(result)
     except Exception as e:
         response_text=""
         if response:
             response_text=",响应信息："+response.text
+        elif isinstance(e,httpx.HTTPStatusError):
+            response_text=",响应信息："+e.response.text
         error_text=f"文本嵌入请求发生错误，异常类型：{str(type(e))},异常信息：{e} {response_text}"
         logger.error(error_text)
         return APIErrorResult(message=error_text)
@@ -410,4 +410,11 @@ class ChatArgs(BaseModel):
         description="设置 seed 使文本生成更具确定性。传入相同的 seed 值且其他参数不变时，模型将尽可能返回相同结果。取值范围：0 到 2^31 - 1。",
         examples=[None]
     )
+    # 只用于会话粘滞，不转发给上游，部分非 OpenAI 格式的上游不接受未知字段
+    user: str | None = Field(
+        default=None,
+        exclude=True,
+        description="终端用户或会话的唯一标识，请求头中没有会话标识时，同一 user 的对话请求会固定路由到同一个上游地址，不会转发给上游",
+        examples=[None]
+    )
     
\ No newline at end of file
@@ -1,26 +1,19 @@
+import httpx
+
+from services import retry_service
 from services.http_service import http_clients
 from services.log_service import logger
-from services.module_load_service import load_ocr_api
+from services.module_load_service import get_api_module
+from services.upstream_service import upstream_pools
 from api_defines.bee.models.ocr_args import OcrArgs as BeeOcrArgs
 from api_defines.bee.models.ocr_result import OcrResultModel as BeeOcrResultModel
 from .models.error_result import APIErrorResult
-import asyncio
 
-ocr_api=None
-ocr_api_initialized = False
-ocr_api_lock = asyncio.Lock()
 
 async def ocr(args:BeeOcrArgs,token: str)->BeeOcrResultModel|APIErrorResult:
     response=None
-    global ocr_api, ocr_api_initialized
     try:
-        if not ocr_api_initialized:
-            async with ocr_api_lock:
-                if not ocr_api_initialized:
-                    ocr_api=load_ocr_api()
-                    await ocr_api.init() # type: ignore
-                    ocr_api_initialized=True
-        
+        ocr_api=await get_api_module("ocr",args.model)
         request_url=await ocr_api.get_request_url(args) # type: ignore
         request_headers =await ocr_api.get_request_headers(token) # type: ignore
         request_args =await ocr_api.get_request_args(pre_process_args(args)) # type: ignore
@@ -30,9 +23,9 @@ async def ocr(args:BeeOcrArgs,token: str)->BeeOcrResultModel|APIErrorResult:
         logger.debug(f"原始请求参数：{args.model_dump_json()}\n")
         logger.debug(f"修改后请求参数：{request_args}\n")
         
-        client=http_clients.chat_client
-        response = await client.post(url=request_url,headers=request_headers,json=request_args)
-        response.raise_for_status()
+        client=http_clients.get_client("ocr",args.model)
+        upstream_pool=upstream_pools.get_pool("ocr",args.model)
+        response = await retry_service.post_with_retry(upstream_pool,client,request_url,request_headers,request_args)
         result_data = response.json()
         logger.debug(f"原始返回参数：{result_data}\n")
         result = await ocr_api.get_request_result(result_data) # type: ignore
@@ -43,6 +36,8 @@ async def ocr(args:BeeOcrArgs,token: str)->BeeOcrResultModel|APIErrorResult:
         response_text=""
         if response:
             response_text=",响应信息："+response.text
+        elif isinstance(e,httpx.HTTPStatusError):
+            response_text=",响应信息："+e.response.text
         error_text=f"文字识别请求发生错误，异常类型：{str(type(e))},异常信息：{e} {response_text}"
         logger.error(error_text)
         return APIErrorResult(message=error_text)
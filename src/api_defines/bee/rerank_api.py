@@ -1,28 +1,20 @@
+import httpx
 
+from services import hedge_service
 from services.http_service import http_clients
 from services.log_service import logger
-from services.module_load_service import load_rerank_api
+from services.module_load_service import get_api_module
+from services.upstream_service import upstream_pools
 
 from .models.error_result import APIErrorResult
 from .models.rerank_args import RerankArgs as BeeRerankArgs
 from .models.rerank_result import RerankResult as BeeRerankResult
-import asyncio
 
-rerank_api=None
-rerank_api_initialized = False
-rerank_api_lock = asyncio.Lock()
 
 async def rerank(args:BeeRerankArgs,token: str)->BeeRerankResult | APIErrorResult:
     response=None
-    global rerank_api, rerank_api_initialized
     try:
-        if not rerank_api_initialized:
-            async with rerank_api_lock:
-                if not rerank_api_initialized:
-                    rerank_api = load_rerank_api()
-                    await rerank_api.init() # type: ignore
-                    rerank_api_initialized=True
-                    
+        rerank_api=await get_api_module("rerank",args.model)
         request_url= await rerank_api.get_request_url(args) # type: ignore
         request_headers = await rerank_api.get_request_headers(token) # type: ignore
         request_args = await rerank_api.get_request_args(pre_process_args(args)) # type: ignore
@@ -32,9 +24,9 @@ async def rerank(args:BeeRerankArgs,token: str)->BeeRerankResult | APIErrorResul
         logger.debug(f"原始请求参数：{args.model_dump_json()}\n")
         logger.debug(f"修改后请求参数：{request_args}\n")
         
-        client=http_clients.rerank_client
-        response = await client.post(url=request_url,headers=request_headers,json=request_args)
-        response.raise_for_status()
+        client=http_clients.get_client("rerank",args.model)
+        upstream_pool=upstream_pools.get_pool("rerank",args.model)
+        response = await hedge_service.post_with_hedge(upstream_pool,client,request_url,request_headers,request_args)
         result_data = response.json()
         logger.debug(f"原始返回参数：{result_data}\n")
         result = await rerank_api.get_request_result(result_data) # type: ignore
@@ -45,6 +37,8 @@ async def rerank(args:BeeRerankArgs,token: str)->BeeRerankResult | APIErrorResul
         response_text=""
         if response:
             response_text=",响应信息："+response.text
+        elif isinstance(e,httpx.HTTPStatusError):
+            response_text=",响应信息："+e.response.text
         error_text=f"重排请求发生错误，异常类型：{str(type(e))},异常信息：{e} {response_text}"
         logger.error(error_text)
         return APIErrorResult(message=error_text)
@@ -4,42 +4,26 @@ from api_defines.bee.models.chat_result import (
     ChatStreamChunkResult as BeeChatStreamChunkResult,
 )
 from services import env_service
-from services.log_service import logger
-import random
+from services.result_service import build_result
+from services.upstream_service import upstream_pools
 
-urls=[]
+pool_name="chat"
 
-async def set_urls():
-    global urls
-    if len(urls) > 0:
-        return
-    
-    env_urls=env_service.get_chat_url()
-    urls=env_urls.split(";")
-    logger.info(f"ocr urls: {urls}")
-
-async def get_url():
-    url=random.choice(urls)
+async def get_url(model:str|None=None,messages:list|None=None):
+    url=upstream_pools.select(pool_name,model,messages)
     return url
 
 async def init():
     """
     初始化函数
     """
-    await set_urls()
+    upstream_pools.get_pool(pool_name)
     
 async def get_request_url(args:BeeChatArgs):
     """
     获取请求 URL 函数
     """
-    global urls
-    if len(urls) == 0:
-        await set_urls()
-        
-    if len(urls) == 0:
-        raise ValueError("chat urls is empty")
-        
-    url=await get_url()
+    url=await get_url(args.model,args.messages)
     return url
 
 async def get_request_headers(token: str):
@@ -146,7 +130,7 @@ async def get_request_result(result:dict)->BeeChatResult:
     #     "choices": result["choices"]
     # }
     result_dict=result
-    result_obj = BeeChatResult(**result_dict)
+    result_obj = build_result(BeeChatResult,result_dict)
     return result_obj
 
 async def get_request_stream_chunk_result(result:dict)->BeeChatStreamChunkResult:
@@ -209,5 +193,5 @@ async def get_request_stream_chunk_result(result:dict)->BeeChatStreamChunkResult
     #     "choices": result["choices"]
     # }
     result_dict=result
-    result_obj = BeeChatStreamChunkResult(**result_dict)
+    result_obj = build_result(BeeChatStreamChunkResult,result_dict)
     return result_obj
\ No newline at end of file
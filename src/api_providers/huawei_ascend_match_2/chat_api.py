@@ -3,38 +3,37 @@ from api_defines.bee.models.chat_result import ChatResult as BeeChatResult
 from api_defines.bee.models.chat_result import (
     ChatStreamChunkResult as BeeChatStreamChunkResult,
 )
-from services import env_service
-from services.log_service import logger
-import random
+from services import env_service, route_service
+from services.result_service import build_result
+from services.upstream_service import upstream_pools
 
-urls=[]
+pool_name="chat"
 
-async def set_urls():
-    global urls
-    if len(urls) > 0:
-        return
-    
-    env_urls=env_service.get_chat_url()
-    urls=env_urls.split(";")
-    logger.info(f"ocr urls: {urls}")
-
-async def get_url():
-    url=random.choice(urls)
+async def get_url(model:str|None=None,messages:list|None=None):
+    url=upstream_pools.select(pool_name,model,messages)
     return url
 
+# 兼容旧配置：模型名称与单独配置地址的环境变量的对应关系，bee_route_config 中配置了同一模型时以路由表为准
+compatible_model_urls={
+    "qwen3-32b":"bee_chat_url_1",
+    "qwen3-14b":"bee_chat_url_2",
+}
+
 async def init():
     """
     初始化函数
     """
-    await set_urls()
+    for model,env_name in compatible_model_urls.items():
+        urls=env_service.get_env(env_name)
+        if urls!="":
+            route_service.add_route(pool_name,model,urls)
+    upstream_pools.get_pool(pool_name)
 
 async def get_request_url(args:BeeChatArgs):
-    if args.model =="qwen3-32b":
-        url=env_service.get_env('bee_chat_url_1')
-    elif args.model =="qwen3-14b":
-        url=env_service.get_env('bee_chat_url_2')
-    else:
-        url=await get_url()
+    """
+    获取请求 URL 函数
+    """
+    url=await get_url(args.model,args.messages)
     return url
 
 async def get_request_headers(token: str):
@@ -141,7 +140,7 @@ async def get_request_result(result:dict)->BeeChatResult:
     #     "choices": result["choices"]
     # }
     result_dict=result
-    result_obj = BeeChatResult(**result_dict)
+    result_obj = build_result(BeeChatResult,result_dict)
     return result_obj
 
 async def get_request_stream_chunk_result(result:dict)->BeeChatStreamChunkResult:
@@ -204,5 +203,5 @@ async def get_request_stream_chunk_result(result:dict)->BeeChatStreamChunkResult
     #     "choices": result["choices"]
     # }
     result_dict=result
-    result_obj = BeeChatStreamChunkResult(**result_dict)
+    result_obj = build_result(BeeChatStreamChunkResult,result_dict)
     return result_obj
\ No newline at end of file
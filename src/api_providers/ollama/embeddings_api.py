@@ -3,42 +3,26 @@ from api_defines.bee.models.embeddings_result import (
     EmbeddingsResult as BeeEmbeddingsResult,
 )
 from services import env_service
-from services.log_service import logger
-import random
+from services.result_service import build_result
+from services.upstream_service import upstream_pools
 
-urls=[]
+pool_name="embeddings"
 
-async def set_urls():
-    global urls
-    if len(urls) > 0:
-        return
-    
-    env_urls=env_service.get_embeddings_url()
-    urls=env_urls.split(";")
-    logger.info(f"embeddings urls: {urls}")
-
-async def get_url():
-    url=random.choice(urls)
+async def get_url(model:str|None=None):
+    url=upstream_pools.select(pool_name,model)
     return url
 
 async def init():
     """
     初始化函数
     """
-    await set_urls()
+    upstream_pools.get_pool(pool_name)
     
 async def get_request_url(args:BeeEmbeddingsArgs):
     """
     获取请求 URL 函数
     """
-    global urls
-    if len(urls) == 0:
-        await set_urls()
-        
-    if len(urls) == 0:
-        raise ValueError("embeddings urls is empty")
-        
-    url=await get_url()
+    url=await get_url(args.model)
     return url
 
 async def get_request_headers(token: str):
@@ -138,5 +122,5 @@ async def get_request_result(result:dict)->BeeEmbeddingsResult:
     #     "data": result["data"]
     # }
     result_dict=result
-    result_obj = BeeEmbeddingsResult(**result_dict)
+    result_obj = build_result(BeeEmbeddingsResult,result_dict)
     return result_obj
@@ -0,0 +1,131 @@
+"""
+# SSE 编解码微基准测试，对比 httpx_sse 逐行解码为字符串的方式与 sse_service.SSEDecoder 直接处理字节的方式
+
+在 src 目录下运行：
+
+python -m benchmarks.sse_benchmark
+python -m benchmarks.sse_benchmark --events 50000 --events-per-chunk 4
+
+- codec：只比较 SSE 解析和重新编码的耗时
+- chat：比较对话流式接口每个事件的完整处理耗时（解析 SSE、解析 JSON、provider 转换、序列化、编码 SSE）
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from httpx_sse import aconnect_sse
+
+from api_defines.bee.models.chat_result import ChatStreamChunkResult
+from services.sse_service import SSEDecoder, encode_sse_data, get_sse_message
+
+
+def get_stream_chunks(events: int, events_per_chunk: int) -> list[bytes]:
+    """
+    生成模拟的上游流式响应，每个事件为一个 token，每 events_per_chunk 个事件组成一次网络读取
+    """
+    messages = []
+    for i in range(events):
+        chunk = {
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion.chunk",
+            "created": 1755739080,
+            "model": "qwen3-32b",
+            "choices": [{"index": 0, "delta": {"content": f"token{i}"}, "finish_reason": None}],
+        }
+        messages.append(f"data: {json.dumps(chunk)}\n\n".encode())
+    messages.append(b"data: [DONE]\n\n")
+    return [b"".join(messages[i:i + events_per_chunk]) for i in range(0, len(messages), events_per_chunk)]
+
+
+def create_client(chunks: list[bytes]) -> httpx.AsyncClient:
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream())
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def httpx_sse_codec(client: httpx.AsyncClient) -> int:
+    count = 0
+    async with aconnect_sse(client, "POST", "http://upstream/v1/chat/completions") as event_source:
+        async for event in event_source.aiter_sse():
+            message = get_sse_message(event.data).encode()
+            count += len(message)
+    return count
+
+
+async def bytes_codec(client: httpx.AsyncClient) -> int:
+    count = 0
+    decoder = SSEDecoder()
+    async with client.stream("POST", "http://upstream/v1/chat/completions") as response:
+        async for chunk in response.aiter_bytes():
+            for data in decoder.feed(chunk):
+                message = encode_sse_data(data)
+                count += len(message)
+    return count
+
+
+async def httpx_sse_chat(client: httpx.AsyncClient) -> int:
+    count = 0
+    async with aconnect_sse(client, "POST", "http://upstream/v1/chat/completions") as event_source:
+        async for event in event_source.aiter_sse():
+            if event.data == "[DONE]":
+                count += len(get_sse_message(event.data).encode())
+                continue
+            result = ChatStreamChunkResult(**event.json())
+            count += len(get_sse_message(result.model_dump_json()).encode())
+    return count
+
+
+async def bytes_chat(client: httpx.AsyncClient) -> int:
+    count = 0
+    decoder = SSEDecoder()
+    async with client.stream("POST", "http://upstream/v1/chat/completions") as response:
+        async for chunk in response.aiter_bytes():
+            for data in decoder.feed(chunk):
+                if data == b"[DONE]":
+                    count += len(encode_sse_data(data))
+                    continue
+                result = ChatStreamChunkResult(**json.loads(data))
+                count += len(encode_sse_data(result.model_dump_json().encode()))
+    return count
+
+
+async def run(name: str, func, chunks: list[bytes], events: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        async with create_client(chunks) as client:
+            start = time.perf_counter()
+            await func(client)
+            best = min(best, time.perf_counter() - start)
+    print(f"{name:<18} {best * 1000:>9.1f} ms  {best / events * 1e6:>7.2f} us/event")
+    return best
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="SSE 编解码微基准测试")
+    parser.add_argument("--events", type=int, default=20000, help="每次测试的事件数")
+    parser.add_argument("--events-per-chunk", type=int, default=1, help="每次网络读取包含的事件数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最快的一次")
+    args = parser.parse_args()
+
+    chunks = get_stream_chunks(args.events, args.events_per_chunk)
+    print(f"events={args.events} events_per_chunk={args.events_per_chunk} repeat={args.repeat}")
+
+    old = await run("codec httpx_sse", httpx_sse_codec, chunks, args.events, args.repeat)
+    new = await run("codec bytes", bytes_codec, chunks, args.events, args.repeat)
+    print(f"codec speedup: {old / new:.2f}x")
+
+    old = await run("chat httpx_sse", httpx_sse_chat, chunks, args.events, args.repeat)
+    new = await run("chat bytes", bytes_chat, chunks, args.events, args.repeat)
+    print(f"chat speedup: {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
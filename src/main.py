@@ -6,12 +6,16 @@ from services.log_service import get_logger
 logger=get_logger(server_name="bee")
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from routers import chat, embeddings, rerank,embed,ocr,asr,tts,file_storage
+from routers import chat, embeddings, rerank,embed,ocr,asr,tts,file_storage,admin
 from services import env_service
+from services.drain_service import DrainMiddleware, drain_manager
 from services.http_service import http_clients
+from services.health_check_service import health_checker
+from services.reload_service import config_reloader
+from services.warmup_service import connection_warmer
 from jinja2 import Environment, FileSystemLoader
 
 bee_version = "1.0.0"
@@ -24,7 +28,16 @@ bee_description = "欢迎使用 Bee, 一个轻量级 LLM API 代理"
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await http_clients.startup()
+    await connection_warmer.prepare()
+    await health_checker.startup()
+    await connection_warmer.startup()
+    await config_reloader.startup()
+    drain_manager.install_signal_handlers()
     yield
+    # uvicorn 等待进行中的请求（包括流式对话）结束或超过 --timeout-graceful-shutdown 后才执行到这里，再关闭连接池
+    await config_reloader.shutdown()
+    await connection_warmer.shutdown()
+    await health_checker.shutdown()
     await http_clients.shutdown()
 
 app = FastAPI(title="Bee",
@@ -35,6 +48,9 @@ app = FastAPI(title="Bee",
               openapi_url="/openapi.json",
               lifespan=lifespan)
 
+# 统计进行中的请求数，停机时记录在日志中
+app.add_middleware(DrainMiddleware)
+
 # 挂载静态文件（确保静态资源能被访问）
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -85,6 +101,7 @@ app.include_router(ocr.router)
 app.include_router(asr.router)
 app.include_router(tts.router)
 app.include_router(file_storage.router)
+app.include_router(admin.router)
 
 @app.get(path="/",include_in_schema=False)
 def home(request: Request):
@@ -107,4 +124,21 @@ def version():
         "description": bee_description,
         "name":"Bee",
         "version":bee_version,
-        }
\ No newline at end of file
+        }
+
+@app.get(path="/live",
+         tags=["Default"],
+         summary="存活检查",
+         description="进程能够处理请求即返回 200，不检查 provider 和上游地址。")
+def live():
+    return {"status":"ok"}
+
+@app.get(path="/ready",
+         tags=["Default"],
+         summary="就绪检查",
+         description="provider 全部加载成功且连接预热完成后返回 200，停机排空期间或未就绪时返回 503，同时返回每个上游地址的状态。")
+def ready():
+    ready_status=connection_warmer.to_dict()
+    ready_status["draining"]=drain_manager.draining
+    ready_status["ready"]=ready_status["ready"] and not drain_manager.draining
+    return JSONResponse(content=ready_status,status_code=200 if ready_status["ready"] else 503)
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from api_defines.bee.models.error_result import APIErrorResult
+from services.auth_service import check_admin_key, require_admin_key
+from services.log_service import logger
+from services.metrics_service import metrics
+from services.reload_service import config_reloader
+from services.upstream_service import upstream_pools
+from services.warmup_service import connection_warmer
+
+router = APIRouter()
+
+@router.get(path="/admin/upstreams",
+            tags=["Admin API"],
+            summary="上游地址池状态",
+            description="查看当前进程中各接口上游地址池的状态，包括进行中请求数、平均响应耗时和健康检查结果。配置了 bee_admin_key 时需要在请求头中携带该密钥。",
+            dependencies=[Depends(check_admin_key)])
+async def upstreams()->dict:
+    return upstream_pools.to_dict()
+
+@router.get(path="/metrics",
+            tags=["Admin API"],
+            summary="Prometheus 指标",
+            description="以 Prometheus 文本格式导出当前进程的指标，如连接池等待耗时、等待超时次数。配置了 bee_admin_key 时需要在请求头中携带该密钥。",
+            dependencies=[Depends(check_admin_key)],
+            response_class=PlainTextResponse)
+async def get_metrics()->str:
+    return metrics.render()
+
+@router.post(path="/admin/reload",
+            tags=["Admin API"],
+            summary="重新加载上游地址配置",
+            description="重新读取 .env 文件和路由表并替换上游地址池，进行中的请求不受影响。只对处理本次请求的 worker 生效，多 worker 时请使用配置文件热更新。"
+                        "需要配置 bee_admin_key 并在请求头中携带该密钥，未配置时返回 403。",
+            dependencies=[Depends(require_admin_key)])
+async def reload()->dict | APIErrorResult:
+    try:
+        config_reloader.reload()
+        await connection_warmer.prepare()
+        return upstream_pools.to_dict()
+    except Exception as e:
+        error_text=f"重新加载配置发生错误，异常类型：{str(type(e))},异常信息：{e}"
+        logger.error(error_text)
+        return APIErrorResult(message=error_text)
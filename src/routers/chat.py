@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
 
 
@@ -11,6 +11,7 @@ from api_defines.bee.models.chat_args import ChatArgs as BeeChatArgs
 from api_defines.bee.models.chat_result import ChatResult as BeeChatResult
 from api_defines.bee.models.error_result import APIErrorResult
 from services.auth_service import get_bearer_token
+from services.session_service import get_session_id
 
 router = APIRouter()
 @router.post(path="/v1/chat/completions",
@@ -67,5 +68,5 @@ data: {"id":"chatcmpl-h9MoKjssEPjL4HBpdPN31ibuM83zfdXd","object":"chat.completio
                     }
                 }
             })
-async def chat(args:BeeChatArgs,token: str = Depends(get_bearer_token))->BeeChatResult | StreamingResponse | APIErrorResult:
-    return await bee_chat(args,token)
\ No newline at end of file
+async def chat(args:BeeChatArgs,request: Request,token: str = Depends(get_bearer_token),session_id: str | None = Depends(get_session_id))->BeeChatResult | StreamingResponse | APIErrorResult:
+    return await bee_chat(args,token,session_id,request=request)
\ No newline at end of file
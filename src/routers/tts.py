@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
 
 
@@ -67,5 +67,5 @@ data: {"id":"chatcmpl-h9MoKjssEPjL4HBpdPN31ibuM83zfdXd","object":"chat.completio
                     }
                 }
             })
-async def tts(args:BeeChatArgs,token: str = Depends(get_bearer_token))->BeeChatResult | StreamingResponse | APIErrorResult:
-    return await bee_chat(args,token)
\ No newline at end of file
+async def tts(args:BeeChatArgs,request: Request,token: str = Depends(get_bearer_token))->BeeChatResult | StreamingResponse | APIErrorResult:
+    return await bee_chat(args,token,endpoint="tts",request=request)
\ No newline at end of file
@@ -1,10 +1,31 @@
+import secrets
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from services import env_service
+
 security = HTTPBearer(auto_error=False,description="模型 API 密钥,如：sk-xxxxxx")
 
 def get_bearer_token(credentials: HTTPAuthorizationCredentials = Depends(security))->str:
     # 没有秘钥就返回默认值
     if not credentials:
         return "sk-default"
-    return credentials.credentials
\ No newline at end of file
+    return credentials.credentials
+
+def require_admin_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # 会修改状态的管理接口，没有配置 bee_admin_key 时关闭，配置后需要携带该密钥
+    admin_key=env_service.get_admin_key()
+    if not admin_key:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail="管理接口未开启，请配置 bee_admin_key")
+    verify_admin_key(credentials,admin_key)
+
+def check_admin_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # 只读的管理接口，配置了 bee_admin_key 时需要携带该密钥，没有配置时不校验
+    admin_key=env_service.get_admin_key()
+    if admin_key:
+        verify_admin_key(credentials,admin_key)
+
+def verify_admin_key(credentials: HTTPAuthorizationCredentials | None,admin_key: str):
+    if not credentials or not secrets.compare_digest(credentials.credentials.encode(),admin_key.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail="管理接口密钥错误",headers={"WWW-Authenticate":"Bearer"})
@@ -0,0 +1,140 @@
+"""
+# 流式合并模块，把短时间内连续到达的多个流式内容合并为一次发送，减少 ASGI send 和 TCP 写入次数
+
+from services import coalesce_service
+
+async with aclosing(coalesce_service.coalesce(results, window_seconds=0.005, max_items=16)) as batches:
+    async for batch in batches:
+        yield b"".join(encode(result) for result in coalesce_service.merge_stream_chunks(batch))
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from typing import TypeVar
+
+import anyio
+
+from api_defines.bee.models.chat_result import ChatStreamChunkResult
+
+T = TypeVar("T")
+
+# 队列中表示上游内容已经读取完毕
+stream_end = object()
+
+
+class StreamError:
+    """
+    读取上游内容时发生的异常，交给消费方重新抛出
+    """
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def coalesce(source: AsyncIterator[T], window_seconds: float, max_items: int) -> AsyncIterator[list[T]]:
+    """
+    在单独的任务中读取 source，第一项到达后最多再等待 window_seconds 秒或凑满 max_items 项，
+    把这段时间内到达的内容作为一批返回。上游本身较慢时每批只有一项，等待时间不超过 window_seconds。
+
+    调用方需要用 contextlib.aclosing 包裹，提前结束时会取消读取任务，读取任务中的 source 随之关闭。
+
+    Args:
+        source (AsyncIterator[T]): 上游内容
+        window_seconds (float): 第一项到达后最多等待的时间（秒）
+        max_items (int): 每批最多包含的项数
+
+    Raises:
+        Exception: 读取 source 时发生的异常，在该异常之前到达的内容会先返回
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_items)
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put(item)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            await queue.put(StreamError(e))
+            return
+        await queue.put(stream_end)
+
+    loop = asyncio.get_running_loop()
+    producer = asyncio.create_task(produce())
+    try:
+        item = await queue.get()
+        while item is not stream_end and not isinstance(item, StreamError):
+            batch = [item]
+            deadline = loop.time() + window_seconds
+            item = None
+            while len(batch) < max_items:
+                # 已经到达的内容直接取出，不再等待
+                if queue.empty():
+                    try:
+                        async with asyncio.timeout_at(deadline):
+                            item = await queue.get()
+                    except TimeoutError:
+                        item = None
+                        break
+                else:
+                    item = queue.get_nowait()
+                if item is stream_end or isinstance(item, StreamError):
+                    break
+                batch.append(item)
+                item = None
+            yield batch
+            if item is None:
+                item = await queue.get()
+
+        if isinstance(item, StreamError):
+            raise item.error
+    finally:
+        producer.cancel()
+        # 等待读取任务关闭上游连接。StreamingResponse 在 anyio 任务组中运行，客户端断开后会反复取消当前任务，
+        # 这些取消会经由 await 传递给读取任务并打断 httpx 关闭连接，因此等待期间屏蔽外部的取消
+        with anyio.CancelScope(shield=True):
+            try:
+                await producer
+            except asyncio.CancelledError:
+                if not producer.done():
+                    raise
+
+
+def is_mergeable(chunk: ChatStreamChunkResult | None) -> bool:
+    """
+    只有一个选项、只包含增量内容的 chunk 可以合并，结束原因、用量统计等 chunk 原样保留
+    """
+    if chunk is None or chunk.usage is not None or len(chunk.choices) != 1:
+        return False
+    choice = chunk.choices[0]
+    return choice.finish_reason is None and choice.delta is not None
+
+
+def merge_stream_chunks(chunks: list[ChatStreamChunkResult | None]) -> list[ChatStreamChunkResult | None]:
+    """
+    合并连续的增量内容 chunk，同一选项的 content、reasoning_content 按顺序拼接，
+    不能合并的 chunk（如带有结束原因、用量统计，或者表示 [DONE] 的 None）保持原有顺序
+
+    Args:
+        chunks (list[ChatStreamChunkResult | None]): 一批连续到达的 chunk
+
+    Returns:
+        list[ChatStreamChunkResult | None]: 合并后的 chunk
+    """
+    merged: list[ChatStreamChunkResult | None] = []
+    for chunk in chunks:
+        previous = merged[-1] if merged else None
+        if not is_mergeable(chunk) or not is_mergeable(previous) or \
+                previous.choices[0].index != chunk.choices[0].index:  # type: ignore
+            merged.append(chunk)
+            continue
+
+        delta = previous.choices[0].delta  # type: ignore
+        chunk_delta = chunk.choices[0].delta  # type: ignore
+        if chunk_delta.content is not None:  # type: ignore
+            delta.content = (delta.content or "") + chunk_delta.content  # type: ignore
+        if chunk_delta.reasoning_content is not None:  # type: ignore
+            delta.reasoning_content = (delta.reasoning_content or "") + chunk_delta.reasoning_content  # type: ignore
+        if delta.role is None:  # type: ignore
+            delta.role = chunk_delta.role  # type: ignore
+    return merged
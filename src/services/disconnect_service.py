@@ -0,0 +1,75 @@
+"""
+# 客户端断开检测模块，客户端（如关闭了对话页面的浏览器）断开连接后立即取消正在进行的上游请求，
+# 关闭上游连接，推理服务可以尽早释放该请求占用的资源
+
+from services.disconnect_service import DisconnectWatcher
+
+async with DisconnectWatcher(request) as watcher:
+    response = await client.post(url=url, ...)
+if watcher.disconnected:
+    return
+"""
+
+import asyncio
+
+from fastapi import Request
+
+from services.log_service import logger
+
+
+class DisconnectWatcher:
+    """
+    在 async with 代码块执行期间监听客户端断开连接，断开后取消代码块中正在等待的操作，并在退出代码块时吞掉这次取消，
+    代码块之后通过 disconnected 判断客户端是否已经断开。
+
+    不依赖 ASGI 服务器和 StreamingResponse 的断开检测：流式响应只有在写入下一段内容时才能发现客户端已断开，
+    上游还在处理提示词或两段内容间隔较长时会继续占用上游资源。
+
+    需要在请求体读取完成后使用，此时 receive 只会收到 http.disconnect 消息。
+    """
+
+    def __init__(self, request: Request | None):
+        self.request = request
+        self.disconnected = False
+        self.task: asyncio.Task | None = None
+        self.watch_task: asyncio.Task | None = None
+        # 是否已经因为客户端断开而取消了代码块
+        self.cancelling = False
+
+    async def __aenter__(self) -> "DisconnectWatcher":
+        if self.request is not None:
+            self.task = asyncio.current_task()
+            self.watch_task = asyncio.create_task(self.watch())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if self.watch_task is not None:
+            self.watch_task.cancel()
+            self.watch_task = None
+
+        if not self.cancelling or self.task is None:
+            return False
+
+        self.cancelling = False
+        logger.info("客户端已断开连接，中断上游请求")
+        if exc_type is not asyncio.CancelledError:
+            # 代码块在取消生效前已经结束，取消会在下一次等待时生效，在这里提前消耗掉
+            try:
+                await asyncio.sleep(0)
+            except asyncio.CancelledError:
+                pass
+            self.task.uncancel()
+            return False
+
+        # 只吞掉本模块发起的取消，服务器停机等其他原因发起的取消继续向上传递
+        return self.task.uncancel() == 0
+
+    async def watch(self):
+        while True:
+            message = await self.request.receive()  # type: ignore
+            if message["type"] == "http.disconnect":
+                break
+        self.disconnected = True
+        if self.task is not None and self.watch_task is not None:
+            self.cancelling = True
+            self.task.cancel()
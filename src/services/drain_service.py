@@ -0,0 +1,89 @@
+"""
+# 优雅停机模块，收到 SIGTERM 后标记排空状态，并记录进行中的请求数（包括流式对话）。
+
+# 等待进行中的请求由 uvicorn 完成：收到停机信号后关闭监听端口和空闲的 keep-alive 连接，
+# 等待其余连接上的请求（包括流式响应）结束，最多等待 --timeout-graceful-shutdown 秒，之后才执行 lifespan 的退出阶段关闭连接池。
+
+from services.drain_service import drain_manager, DrainMiddleware
+
+app.add_middleware(DrainMiddleware)
+
+# lifespan 启动时接管停机信号
+drain_manager.install_signal_handlers()
+"""
+
+import signal
+import threading
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from services.log_service import logger
+
+
+class DrainManager:
+    """
+    记录进行中的请求数，收到停机信号后进入排空状态
+    """
+
+    def __init__(self):
+        self.draining = False
+        self.in_flight = 0
+
+    def install_signal_handlers(self):
+        """
+        在 uvicorn 的信号处理函数之前标记排空状态，再交给原有的处理函数停止接收新连接。
+
+        需要在 uvicorn 安装信号处理函数之后调用，即在 lifespan 启动阶段调用。
+        """
+        # 只有主线程可以设置信号处理函数
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            previous_handler = signal.getsignal(sig)
+            if not callable(previous_handler):
+                continue
+
+            def handler(signum, frame, previous_handler=previous_handler):
+                self.start_draining()
+                previous_handler(signum, frame)
+
+            signal.signal(sig, handler)
+
+    def start_draining(self):
+        if self.draining:
+            return
+        self.draining = True
+        logger.info(f"开始停机，不再接收新的连接，等待 {self.in_flight} 个进行中的请求结束")
+
+    def request_started(self):
+        self.in_flight += 1
+
+    def request_finished(self):
+        self.in_flight -= 1
+
+
+class DrainMiddleware:
+    """
+    统计进行中的请求数，流式响应在最后一段内容发送完成后才算结束。
+
+    排空期间不需要拒绝新的请求：uvicorn 收到停机信号后不再接收新连接，关闭空闲的 keep-alive 连接，
+    进行中的请求完成后也会关闭所在的连接，不会再有新的请求到达。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        drain_manager.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            drain_manager.request_finished()
+
+
+drain_manager = DrainManager()
@@ -7,6 +7,10 @@ def get_auth_type():
 def get_auth_key():
     return os.getenv('bee_auth_key', 'sk_123')
 
+def get_admin_key():
+    # 管理接口的访问密钥，为空时关闭重新加载配置等会修改状态的管理接口
+    return os.getenv('bee_admin_key', '')
+
 def get_embeddings_url():
     # 支持英文的分号;分隔
     return os.getenv('bee_embeddings_url', 'http://localhost/v1/embeddings')
@@ -34,6 +38,10 @@ def get_tts_url():
 def get_provider_type():
     return os.getenv('bee_provider_type', 'gpustack')
 
+def get_endpoint_provider_type(endpoint):
+    # 接口单独使用的 provider，如 bee_embeddings_provider_type=ollama，为空时使用 bee_provider_type
+    return os.getenv(f'bee_{endpoint}_provider_type', get_provider_type())
+
 def get_show_swagger():
     return os.getenv('bee_show_swagger', 'true')
 
@@ -47,4 +55,144 @@ def get_bee_workers():
     return os.getenv('bee_workers', '1')
 
 def get_env(env_name):
-    return os.getenv(env_name, '')
\ No newline at end of file
+    return os.getenv(env_name, '')
+
+def get_upstream_policy(pool_name):
+    # 上游地址选择策略：least_outstanding（最少进行中请求数）、ewma（响应耗时加权）、prefix_affinity（按对话前缀一致性哈希）
+    default_policies={
+        "embeddings": "ewma",
+        "rerank": "ewma",
+    }
+    return os.getenv(f'bee_{pool_name}_upstream_policy', default_policies.get(pool_name, 'least_outstanding'))
+
+def get_upstream_ewma_alpha():
+    # 响应耗时指数加权移动平均的平滑系数，越大越偏向最近一次的耗时
+    return os.getenv('bee_upstream_ewma_alpha', '0.3')
+
+def get_prefix_affinity_turns():
+    # prefix_affinity 策略下，系统消息之后计入路由前缀的消息条数，0 表示只按系统消息路由
+    return os.getenv('bee_prefix_affinity_turns', '1')
+
+def get_prefix_affinity_load_factor():
+    # prefix_affinity 策略下单个地址的进行中请求数最多为平均值的多少倍，超过后顺延到哈希环上的下一个地址
+    return os.getenv('bee_prefix_affinity_load_factor', '1.25')
+
+def get_config_watch():
+    # 是否监听 .env 文件和路由表文件，文件变化后热更新上游地址池
+    return os.getenv('bee_config_watch', 'true')
+
+def get_session_header():
+    # 会话标识请求头，同一会话的对话请求会固定路由到同一个上游地址
+    return os.getenv('bee_session_header', 'x-session-id')
+
+def get_sticky_session_ttl():
+    # 会话粘滞的有效时间（秒），会话超过该时间没有新的请求时重新选择地址，0 表示不开启
+    return os.getenv('bee_sticky_session_ttl', '600')
+
+def get_sticky_session_max():
+    # 最多保存的会话数，超过后淘汰最久未使用的会话
+    return os.getenv('bee_sticky_session_max', '10000')
+
+def get_max_connections(endpoint):
+    # 接口客户端连接池的最大连接数，接口可选 chat、embeddings、rerank、ocr、asr、tts
+    return os.getenv(f'bee_{endpoint}_max_connections', '100')
+
+def get_max_keepalive_connections(endpoint):
+    # 接口客户端连接池的最大空闲保持连接数
+    return os.getenv(f'bee_{endpoint}_max_keepalive_connections', '20')
+
+def get_keepalive_expiry(endpoint):
+    # 空闲连接保持时间（秒），大于健康检查间隔时预热的连接可以一直保留
+    return os.getenv(f'bee_{endpoint}_keepalive_expiry', '60')
+
+def get_pool_timeout(endpoint):
+    # 等待连接池分配连接的超时时间（秒）
+    return os.getenv(f'bee_{endpoint}_pool_timeout', '5')
+
+def get_read_timeout(endpoint, default):
+    # 读取上游响应的超时时间（秒），默认值按接口区分
+    return os.getenv(f'bee_{endpoint}_read_timeout', default)
+
+def get_http2(endpoint):
+    # HTTP/2 模式：false 只使用 HTTP/1.1，true 通过 TLS ALPN 协商，h2c 对明文地址直接使用 HTTP/2
+    return os.getenv(f'bee_{endpoint}_http2', 'false')
+
+def get_warmup_connections():
+    # 启动和配置热更新后为每个上游地址预先建立的保持连接数，0 表示不预热
+    return os.getenv('bee_warmup_connections', '1')
+
+def get_warmup_timeout():
+    # 预热请求的超时时间（秒）
+    return os.getenv('bee_warmup_timeout', '5')
+
+def get_chat_stream_passthrough():
+    # provider 声明了 stream_passthrough 时是否直接转发上游的流式响应，不逐块解析和转换，
+    # 直通时不会在 usage 中填入 Bee 计时的性能指标，默认关闭
+    return os.getenv('bee_chat_stream_passthrough', 'false')
+
+def get_trust_upstream():
+    # 是否信任上游返回的内容，为 true 时 provider 不校验直接构建结果对象
+    return os.getenv('bee_trust_upstream', 'false')
+
+def get_chat_coalesce_ms():
+    # 流式对话的合并窗口（毫秒），该时间内连续到达的增量内容合并为一个 chunk 发送，0 表示不合并
+    return os.getenv('bee_chat_coalesce_ms', '0')
+
+def get_chat_coalesce_max_tokens():
+    # 流式对话每次合并的最大 chunk 数
+    return os.getenv('bee_chat_coalesce_max_tokens', '16')
+
+def get_health_check_interval():
+    # 上游地址健康检查间隔（秒），0 表示不开启
+    return os.getenv('bee_health_check_interval', '10')
+
+def get_health_check_timeout():
+    return os.getenv('bee_health_check_timeout', '3')
+
+def get_health_check_path():
+    # 健康检查地址的路径，如 /health，为空时直接探测上游地址本身
+    return os.getenv('bee_health_check_path', '')
+
+def get_health_check_unhealthy_threshold():
+    # 连续失败多少次后暂停向该地址分配请求
+    return os.getenv('bee_health_check_unhealthy_threshold', '2')
+
+def get_health_check_healthy_threshold():
+    # 连续成功多少次后恢复向该地址分配请求
+    return os.getenv('bee_health_check_healthy_threshold', '2')
+
+def get_circuit_breaker_failure_threshold():
+    # 上游地址连续失败多少次后熔断，0 表示不开启熔断
+    return os.getenv('bee_circuit_breaker_failure_threshold', '5')
+
+def get_circuit_breaker_open_seconds():
+    # 熔断持续时间（秒），到期后放行一个试探请求
+    return os.getenv('bee_circuit_breaker_open_seconds', '10')
+
+def get_retry_max_attempts():
+    # 幂等请求最多尝试的次数（包含第一次请求），1 表示不重试
+    return os.getenv('bee_retry_max_attempts', '3')
+
+def get_retry_budget_ratio():
+    # 重试预算：重试请求最多占正常请求的比例
+    return os.getenv('bee_retry_budget_ratio', '0.2')
+
+def get_retry_budget_min_per_second():
+    # 重试预算：每秒至少允许的重试次数，保证低流量时也能重试
+    return os.getenv('bee_retry_budget_min_per_second', '1')
+
+def get_hedge_enabled(pool_name):
+    # 是否为向量、重排请求开启对冲请求
+    return os.getenv(f'bee_{pool_name}_hedge', 'false')
+
+def get_hedge_percentile():
+    # 主请求耗时超过最近响应耗时的该百分位数后发起对冲请求
+    return os.getenv('bee_hedge_percentile', '95')
+
+def get_hedge_min_delay_ms():
+    # 发起对冲请求前至少等待的时间（毫秒）
+    return os.getenv('bee_hedge_min_delay_ms', '10')
+
+def get_route_config():
+    # 模型路由表，JSON 字符串或 JSON 文件路径，为空时所有模型使用接口默认的地址池
+    return os.getenv('bee_route_config', '')
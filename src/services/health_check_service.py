@@ -0,0 +1,122 @@
+"""
+# 上游地址健康检查模块，在 main.py 的 lifespan 中启动和停止
+
+from services.health_check_service import health_checker
+
+await health_checker.startup()
+await health_checker.shutdown()
+"""
+
+import asyncio
+
+import httpx
+
+from services import env_service
+from services.http_service import UnixSocketClient, UnixSocketTransport, split_unix_url
+from services.log_service import logger
+from services.upstream_service import Upstream, upstream_pools
+
+
+def get_health_check_url(url: str) -> str:
+    """
+    获取上游地址对应的健康检查地址，配置了 bee_health_check_path 时替换地址的路径部分。
+
+    Args:
+        url (str): 上游地址
+
+    Returns:
+        str: 健康检查地址
+    """
+    health_check_path = env_service.get_health_check_path()
+    if health_check_path == "":
+        return url
+    # unix socket 地址只替换 socket 文件之后的请求路径
+    unix_url = split_unix_url(url)
+    if unix_url is not None:
+        return f"unix://{unix_url[0]}{health_check_path}"
+    return str(httpx.URL(url).copy_with(path=health_check_path, query=None))
+
+
+class HealthChecker:
+    """
+    定时探测所有上游地址，连续失败的地址暂停分配请求，连续成功后再恢复
+    """
+
+    def __init__(self):
+        self.client: UnixSocketClient | None = None
+        self.task: asyncio.Task | None = None
+        self.interval = 0.0
+        self.unhealthy_threshold = 2
+        self.healthy_threshold = 2
+
+    async def startup(self):
+        self.interval = float(env_service.get_health_check_interval())
+        if self.interval <= 0:
+            logger.info("未开启上游地址健康检查")
+            return
+
+        self.unhealthy_threshold = int(env_service.get_health_check_unhealthy_threshold())
+        self.healthy_threshold = int(env_service.get_health_check_healthy_threshold())
+        self.client = UnixSocketClient(timeout=float(env_service.get_health_check_timeout()), transport=UnixSocketTransport())
+        self.task = asyncio.create_task(self.run())
+        logger.info(f"开启上游地址健康检查，间隔 {self.interval} 秒")
+
+    async def shutdown(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.error(f"上游地址健康检查发生错误，异常类型：{str(type(e))},异常信息：{e}")
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self):
+        """
+        探测所有地址池中的地址，同一个地址出现在多个地址池时只探测一次
+        """
+        upstream_groups: dict[str, list[Upstream]] = {}
+        for pool in list(upstream_pools.pools.values()):
+            for upstream in pool.upstreams.values():
+                upstream_groups.setdefault(upstream.url, []).append(upstream)
+
+        await asyncio.gather(*(self.check(url, upstreams) for url, upstreams in upstream_groups.items()))
+
+    async def check(self, url: str, upstreams: list[Upstream]):
+        success = await self.probe(url)
+        for upstream in upstreams:
+            changed = upstream.record_health_check(success, self.unhealthy_threshold, self.healthy_threshold)
+            if not changed:
+                continue
+            if upstream.healthy:
+                logger.info(f"上游地址 {url} 健康检查连续成功 {self.healthy_threshold} 次，恢复分配请求")
+            else:
+                logger.warning(f"上游地址 {url} 健康检查连续失败 {self.unhealthy_threshold} 次，暂停分配请求")
+
+    async def probe(self, url: str) -> bool:
+        """
+        探测一次上游地址，能建立连接且响应状态码小于 500 即认为健康。
+
+        未配置健康检查路径时探测的是接口地址本身，GET 请求返回 404、405 等状态码同样说明服务存活。
+        """
+        if self.client is None:
+            return True
+        try:
+            response = await self.client.get(get_health_check_url(url))
+            return response.status_code < 500
+        except Exception as e:
+            logger.debug(f"上游地址 {url} 健康检查失败，异常类型：{str(type(e))},异常信息：{e}")
+            return False
+
+
+health_checker = HealthChecker()
@@ -0,0 +1,134 @@
+"""
+# 对冲请求模块，向量、重排请求在主请求迟迟没有返回时向另一个上游地址发起相同的请求，取先返回的结果
+
+from services import hedge_service
+
+response = await hedge_service.post_with_hedge(upstream_pool, client, url, headers, json_data)
+"""
+
+import asyncio
+import time
+from collections import deque
+
+import httpx
+
+from services import env_service, retry_service
+from services.log_service import logger
+from services.upstream_service import UpstreamPool
+
+# 计算对冲等待时间需要的最少样本数
+hedge_min_samples = 20
+
+
+class LatencyWindow:
+    """
+    保存最近一段时间成功请求的响应耗时，用于计算百分位数
+    """
+
+    def __init__(self, max_samples: int = 200):
+        self.samples: deque[float] = deque(maxlen=max_samples)
+
+    def record(self, latency_ms: float) -> None:
+        self.samples.append(latency_ms)
+
+    def percentile(self, percent: float) -> float | None:
+        """
+        获取最近响应耗时的百分位数，样本不足时返回 None
+        """
+        if len(self.samples) < hedge_min_samples:
+            return None
+        sorted_samples = sorted(self.samples)
+        index = min(len(sorted_samples) - 1, int(len(sorted_samples) * percent / 100))
+        return sorted_samples[index]
+
+
+latency_windows: dict[str, LatencyWindow] = {}
+
+
+def get_latency_window(pool_name: str) -> LatencyWindow:
+    latency_window = latency_windows.get(pool_name)
+    if latency_window is None:
+        latency_window = LatencyWindow()
+        latency_windows[pool_name] = latency_window
+    return latency_window
+
+
+def get_hedge_delay_ms(upstream_pool: UpstreamPool) -> float | None:
+    """
+    获取发起对冲请求前的等待时间，未开启对冲、地址不足两个或样本不足时返回 None
+    """
+    if env_service.get_hedge_enabled(upstream_pool.endpoint) != "true":
+        return None
+
+    if len(upstream_pool.upstreams) < 2:
+        return None
+
+    delay_ms = get_latency_window(upstream_pool.name).percentile(float(env_service.get_hedge_percentile()))
+    if delay_ms is None:
+        return None
+
+    return max(delay_ms, float(env_service.get_hedge_min_delay_ms()))
+
+
+async def cancel_task(task: asyncio.Task) -> None:
+    if task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+async def post_with_hedge(upstream_pool: UpstreamPool,
+                          client: httpx.AsyncClient,
+                          url: str,
+                          headers: dict,
+                          json_data: dict) -> httpx.Response:
+    """
+    发起 POST 请求，主请求耗时超过最近响应耗时的百分位数后，向另一个上游地址发起对冲请求，
+    返回先成功的结果并取消另一个请求。
+
+    对冲请求和重试共用重试预算，预算不足时不发起对冲请求；未开启对冲时等同于 retry_service.post_with_retry。
+
+    Args:
+        upstream_pool (UpstreamPool): 请求所属的上游地址池
+        client (httpx.AsyncClient): 发起请求的客户端
+        url (str): 主请求的上游地址
+        headers (dict): 请求头
+        json_data (dict): 请求参数
+
+    Returns:
+        httpx.Response: 状态码正常的响应
+    """
+    latency_window = get_latency_window(upstream_pool.name)
+    hedge_delay_ms = get_hedge_delay_ms(upstream_pool)
+    start_time = time.perf_counter()
+
+    if hedge_delay_ms is None:
+        response = await retry_service.post_with_retry(upstream_pool, client, url, headers, json_data)
+        latency_window.record((time.perf_counter() - start_time) * 1000)
+        return response
+
+    primary_task = asyncio.create_task(retry_service.post_with_retry(upstream_pool, client, url, headers, json_data))
+    tasks = {primary_task}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay_ms / 1000)
+        if not done and url in upstream_pool.upstreams and retry_service.get_retry_budget(upstream_pool.name).try_withdraw():
+            hedge_url = upstream_pool.select(exclude={url})
+            logger.info(f"请求上游地址 {url} 超过 {hedge_delay_ms:.0f} 毫秒未返回，发起对冲请求，地址 {hedge_url}")
+            tasks.add(asyncio.create_task(
+                retry_service.post_with_retry(upstream_pool, client, hedge_url, headers, json_data, count_request=False)))
+
+        # 返回先成功的结果，全部失败时抛出主请求的异常
+        pending = tasks
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    latency_window.record((time.perf_counter() - start_time) * 1000)
+                    return task.result()
+        return primary_task.result()
+    finally:
+        for task in tasks:
+            await cancel_task(task)
@@ -1,33 +1,257 @@
+import importlib.util
+import re
+import time
+
 import httpx
 
+from services import env_service, route_service
+from services.log_service import logger
+from services.metrics_service import metrics
+
+pool_wait_seconds=metrics.histogram("bee_http_pool_wait_seconds","等待连接池分配连接的耗时（秒）",["client"])
+pool_timeouts_total=metrics.counter("bee_http_pool_timeouts_total","等待连接池超时的次数",["client"])
+
+# 与 Bee 部署在同一台机器上的上游可以使用 unix socket 地址，如 unix:///run/tei.sock/v1/embeddings，
+# socket 文件路径以 .sock 结尾，之后的部分为 HTTP 请求路径
+unix_url_pattern=re.compile(r"^unix://(/.*?\.sock)(?=/|\?|$)(.*)$")
+
+
+def split_unix_url(url:str)->tuple[str,str]|None:
+    """
+    拆分 unix socket 地址
+
+    Args:
+        url (str): 上游地址
+
+    Returns:
+        tuple[str,str]|None: （socket 文件路径，HTTP 请求路径），不是 unix socket 地址时返回 None
+    """
+    if not url.startswith("unix://"):
+        return None
+    match=unix_url_pattern.match(url)
+    if match is None:
+        raise ValueError(f"unix socket 地址 {url} 格式错误，socket 文件路径需以 .sock 结尾，如 unix:///run/tei.sock/v1/embeddings")
+    socket_path,request_path=match.groups()
+    if not request_path.startswith("/"):
+        request_path="/"+request_path
+    return socket_path,request_path
+
+
+class UnixSocketClient(httpx.AsyncClient):
+    """
+    支持 unix socket 地址的客户端，请求地址改写为 http://localhost 加请求路径，socket 文件路径放在请求的 extensions 中，
+    由 UnixSocketTransport 选择对应的传输层。日志、地址池等仍然使用原始的 unix socket 地址。
+    """
+
+    def build_request(self,method,url,**kwargs)->httpx.Request:
+        unix_url=split_unix_url(url) if isinstance(url,str) else None
+        if unix_url is None:
+            return super().build_request(method,url,**kwargs)
+
+        socket_path,request_path=unix_url
+        extensions=dict(kwargs.pop("extensions",None) or {})
+        extensions["unix_socket"]=socket_path
+        return super().build_request(method,f"http://localhost{request_path}",extensions=extensions,**kwargs)
+
+
+class UnixSocketTransport(httpx.AsyncBaseTransport):
+    """
+    普通地址使用 TCP 传输层，unix socket 地址按 socket 文件各自使用一个传输层，跳过本机回环网络的 TCP 协议栈。
+    每个 socket 文件的连接池大小与 TCP 传输层的配置相同。
+    """
+
+    def __init__(self,**kwargs):
+        self.kwargs=kwargs
+        self.transport=httpx.AsyncHTTPTransport(**kwargs)
+        self.uds_transports:dict[str,httpx.AsyncHTTPTransport]={}
+
+    async def handle_async_request(self,request:httpx.Request)->httpx.Response:
+        socket_path=request.extensions.get("unix_socket")
+        if socket_path is None:
+            return await self.transport.handle_async_request(request)
+
+        transport=self.uds_transports.get(socket_path)
+        if transport is None:
+            transport=httpx.AsyncHTTPTransport(uds=socket_path,**self.kwargs)
+            self.uds_transports[socket_path]=transport
+        return await transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+        for transport in self.uds_transports.values():
+            await transport.aclose()
+        self.uds_transports={}
+
+
+class MetricsTransport(httpx.AsyncBaseTransport):
+    """
+    在默认传输层外统计连接池的等待耗时和等待超时次数。
+
+    httpcore 在请求分配到连接后才会触发第一个 trace 事件（新建连接时为 connect_tcp，复用连接时为发送请求头），
+    从发起请求到第一个 trace 事件之间的时间即为等待连接池的耗时。
+    """
+
+    def __init__(self,client_name:str,**kwargs):
+        self.client_name=client_name
+        self.transport=UnixSocketTransport(**kwargs)
+
+    async def handle_async_request(self,request:httpx.Request)->httpx.Response:
+        start_time=time.perf_counter()
+        connection_assigned=False
+        previous_trace=request.extensions.get("trace")
+
+        async def trace(event_name:str,info:dict):
+            nonlocal connection_assigned
+            if not connection_assigned:
+                connection_assigned=True
+                pool_wait_seconds.observe(time.perf_counter()-start_time,client=self.client_name)
+            if previous_trace is not None:
+                await previous_trace(event_name,info)
+
+        request.extensions["trace"]=trace
+        try:
+            return await self.transport.handle_async_request(request)
+        except httpx.PoolTimeout:
+            pool_timeouts_total.inc(client=self.client_name)
+            raise
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def get_limits(endpoint:str)->httpx.Limits:
+    """
+    读取接口客户端的连接池配置
+    """
+    return httpx.Limits(
+        max_connections=int(env_service.get_max_connections(endpoint)),
+        max_keepalive_connections=int(env_service.get_max_keepalive_connections(endpoint)),
+        keepalive_expiry=float(env_service.get_keepalive_expiry(endpoint))
+    )
+
+
+def get_http2_options(http2_mode:str)->dict:
+    """
+    将 HTTP/2 模式转换为传输层参数
+
+    false：只使用 HTTP/1.1；
+    true：https 地址通过 TLS ALPN 协商 HTTP/2，上游不支持时回退到 HTTP/1.1，http 地址仍使用 HTTP/1.1；
+    h2c：不协商，直接使用 HTTP/2（prior knowledge），适用于 vLLM 等支持明文 HTTP/2 的上游。
+    """
+    http2_mode=http2_mode.strip().lower()
+    if http2_mode not in ("true","h2c"):
+        return {"http1":True,"http2":False}
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("未安装 h2，无法使用 HTTP/2，继续使用 HTTP/1.1")
+        return {"http1":True,"http2":False}
+    return {"http1":http2_mode!="h2c","http2":True}
+
+
+def create_client(client_name:str,timeout:httpx.Timeout,limits:httpx.Limits,http2_mode:str="false")->UnixSocketClient:
+    """
+    创建发起上游请求的客户端，连接池的等待耗时和超时次数按 client_name 统计
+
+    使用 HTTP/2 时同一上游的并发请求复用少量连接，max_connections 限制的是连接数而不是并发请求数
+    """
+    return UnixSocketClient(timeout=timeout,transport=MetricsTransport(client_name,limits=limits,**get_http2_options(http2_mode)))
+
 
 class HttpClientManager:
     def __init__(self):
         self.embeddings_client:httpx.AsyncClient
         self.rerank_client:httpx.AsyncClient
         self.chat_client:httpx.AsyncClient
+        self.ocr_client:httpx.AsyncClient
+        self.asr_client:httpx.AsyncClient
+        self.tts_client:httpx.AsyncClient
+        # 路由表中配置了连接数限制或 HTTP/2 模式的模型使用单独的客户端，键为“接口名称:模型名称:连接池配置”
+        self.route_clients:dict[str,httpx.AsyncClient]={}
 
     async def startup(self):
-        self.embeddings_client = httpx.AsyncClient(timeout=httpx.Timeout(
+        self.embeddings_client = create_client("embeddings",httpx.Timeout(
             connect=3.0,
-            read=60.0,
+            read=float(env_service.get_read_timeout("embeddings","60")),
             write=30.0,
-            pool=5.0
-        ))
-        
-        self.rerank_client = httpx.AsyncClient(timeout=httpx.Timeout(
+            pool=float(env_service.get_pool_timeout("embeddings"))
+        ),get_limits("embeddings"),env_service.get_http2("embeddings"))
+
+        self.rerank_client = create_client("rerank",httpx.Timeout(
             connect=3.0,
-            read=60.0,
+            read=float(env_service.get_read_timeout("rerank","60")),
             write=310.0,
-            pool=5.0
-        ))
-        
-        self.chat_client = httpx.AsyncClient(timeout=httpx.Timeout(
+            pool=float(env_service.get_pool_timeout("rerank"))
+        ),get_limits("rerank"),env_service.get_http2("rerank"))
+
+        self.chat_client = create_client("chat",httpx.Timeout(
             connect=3.0,   # 连接服务器最多 3 秒
-            read=300.0,     # 读取响应最多 30 秒（适合大响应或慢模型）
+            read=float(env_service.get_read_timeout("chat","300")),     # 读取响应最多 300 秒（适合大响应或慢模型）
             write=30.0,    # 发送请求最多 10 秒
-            pool=5.0       # 等待连接池最多 5 秒
-        ))
+            pool=float(env_service.get_pool_timeout("chat"))       # 等待连接池的时间，默认 5 秒
+        ),get_limits("chat"),env_service.get_http2("chat"))
+
+        # 文字识别上传的图片较大，写入时间比对话长；多页识别耗时较长，读取时间与对话相同
+        self.ocr_client = create_client("ocr",httpx.Timeout(
+            connect=3.0,
+            read=float(env_service.get_read_timeout("ocr","300")),
+            write=60.0,
+            pool=float(env_service.get_pool_timeout("ocr"))
+        ),get_limits("ocr"),env_service.get_http2("ocr"))
+
+        # 语音识别上传音频，长音频识别耗时较长，读取时间与对话相同
+        self.asr_client = create_client("asr",httpx.Timeout(
+            connect=3.0,
+            read=float(env_service.get_read_timeout("asr","300")),
+            write=60.0,
+            pool=float(env_service.get_pool_timeout("asr"))
+        ),get_limits("asr"),env_service.get_http2("asr"))
+
+        # 语音合成返回音频，读取时间与对话相同
+        self.tts_client = create_client("tts",httpx.Timeout(
+            connect=3.0,
+            read=float(env_service.get_read_timeout("tts","300")),
+            write=30.0,
+            pool=float(env_service.get_pool_timeout("tts"))
+        ),get_limits("tts"),env_service.get_http2("tts"))
+
+    def get_client(self,endpoint:str,model:str|None=None)->httpx.AsyncClient:
+        """
+        获取接口或模型使用的客户端，路由表中为模型配置了连接数限制或 HTTP/2 模式时使用单独的连接池，
+        超时时间与接口默认的客户端相同
+
+        Args:
+            endpoint (str): 接口名称，如 chat、embeddings
+            model (str | None): 模型名称
+
+        Returns:
+            httpx.AsyncClient: 发起请求的客户端
+        """
+        endpoint_clients={
+            "embeddings":self.embeddings_client,
+            "rerank":self.rerank_client,
+            "ocr":self.ocr_client,
+            "asr":self.asr_client,
+            "tts":self.tts_client,
+        }
+        default_client=endpoint_clients.get(endpoint,self.chat_client)
+
+        route=route_service.get_route(endpoint,model)
+        if route is None or (route.max_connections is None and route.max_keepalive_connections is None and route.keepalive_expiry is None and route.http2 is None):
+            return default_client
+
+        # 连接池配置作为键的一部分，热更新修改配置后使用新的客户端，旧客户端上进行中的请求不受影响
+        name=f"{endpoint}:{model}:{route.max_connections}:{route.max_keepalive_connections}:{route.keepalive_expiry}:{route.http2}"
+        client=self.route_clients.get(name)
+        if client is None:
+            default_limits=get_limits(endpoint)
+            limits=httpx.Limits(
+                max_connections=route.max_connections or default_limits.max_connections,
+                max_keepalive_connections=route.max_keepalive_connections or default_limits.max_keepalive_connections,
+                keepalive_expiry=route.keepalive_expiry if route.keepalive_expiry is not None else default_limits.keepalive_expiry
+            )
+            http2_mode=route.http2 if route.http2 is not None else env_service.get_http2(endpoint)
+            client=create_client(f"{endpoint}:{model}",default_client.timeout,limits,http2_mode)
+            self.route_clients[name]=client
+        return client
 
     async def shutdown(self):
         if self.embeddings_client:
@@ -36,5 +260,14 @@ class HttpClientManager:
             await self.rerank_client.aclose()
         if self.chat_client:
             await self.chat_client.aclose()
+        if self.ocr_client:
+            await self.ocr_client.aclose()
+        if self.asr_client:
+            await self.asr_client.aclose()
+        if self.tts_client:
+            await self.tts_client.aclose()
+        for client in self.route_clients.values():
+            await client.aclose()
+        self.route_clients={}
 
 http_clients = HttpClientManager()
@@ -0,0 +1,169 @@
+"""
+# 对话延迟统计模块，由 Bee 自己计时得到首 token 延迟、每个输出 token 的平均耗时和每秒输出 token 数，
+# 上游没有返回这些性能指标时填入 usage，同时按模型导出直方图
+
+from services.latency_service import ChatLatencyTimer
+
+timer = ChatLatencyTimer(endpoint="chat", model=args.model, stream=True)
+# 每个解析后的流式 chunk
+timer.chunk_received(result)
+# 响应正常结束后导出指标
+timer.finish()
+"""
+
+import time
+
+from api_defines.bee.models.chat_result import ChatChoiceDeltaModel, ChatStreamChunkResult, ChatUsageModel
+from services import route_service
+from services.metrics_service import metrics
+
+time_to_first_token_seconds = metrics.histogram(
+    "bee_chat_time_to_first_token_seconds",
+    "流式请求从发起上游请求到收到第一个输出 token 的耗时（秒）",
+    ["endpoint", "model", "stream"],
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+time_per_output_token_seconds = metrics.histogram(
+    "bee_chat_time_per_output_token_seconds",
+    "每个输出 token 的平均耗时（秒）",
+    ["endpoint", "model", "stream"],
+    (0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.2, 0.5, 1),
+)
+request_duration_seconds = metrics.histogram(
+    "bee_chat_request_duration_seconds",
+    "从发起上游请求到收到最后一个输出 token 的耗时（秒），非流式请求为收到完整响应的耗时",
+    ["endpoint", "model", "stream"],
+    (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+output_tokens_per_second = metrics.histogram(
+    "bee_chat_tokens_per_second",
+    "每秒输出 token 数",
+    ["endpoint", "model", "stream"],
+    (1, 5, 10, 20, 30, 50, 75, 100, 200, 500),
+)
+
+
+# 没有配置路由的模型统一使用的标签值，避免客户端传入任意模型名称导致指标数量无限增长
+other_model_label = "other"
+
+
+def get_model_label(endpoint: str, model: str | None) -> str:
+    """
+    路由表中配置了的模型（包括 provider 补充的路由）使用模型名称作为标签，其他模型归入 other。
+    asr、tts 没有单独配置路由时使用对话的路由。
+    """
+    if route_service.get_route(endpoint, model) is not None or route_service.get_route("chat", model) is not None:
+        return model  # type: ignore
+    return other_model_label
+
+
+def has_output(delta: ChatChoiceDeltaModel | None) -> bool:
+    return delta is not None and bool(delta.content or delta.reasoning_content)
+
+
+class ChatLatencyTimer:
+    """
+    记录一次对话请求的计时，创建时开始计时，应在发起上游请求之前创建。
+
+    流式请求：首 token 延迟为收到第一个包含输出内容的 chunk 的耗时，每个输出 token 的平均耗时和每秒输出 token 数
+    按第一个到最后一个输出 token 之间的时间计算，不包含首 token 延迟。
+    非流式请求：所有 token 随完整响应一起到达，无法得到首 token 延迟，不填写；每个输出 token 的平均耗时和每秒输出 token 数按响应耗时计算。
+
+    输出 token 数优先使用上游返回的 completion_tokens，没有时使用包含输出内容的 chunk 数。
+    """
+
+    def __init__(self, endpoint: str, model: str, stream: bool):
+        self.endpoint = endpoint
+        self.model = model
+        self.stream = stream
+        self.start_time = time.perf_counter()
+        self.first_token_time: float | None = None
+        self.last_token_time: float | None = None
+        # 包含输出内容的 chunk 数
+        self.token_chunks = 0
+        # 上游返回的输出 token 数
+        self.completion_tokens = 0
+        self.finished = False
+
+    def tokens_received(self):
+        """
+        收到输出内容时调用，记录首个和最后一个输出 token 的时间
+        """
+        now = time.perf_counter()
+        if self.first_token_time is None:
+            self.first_token_time = now
+        self.last_token_time = now
+
+    def chunk_received(self, chunk: ChatStreamChunkResult | None):
+        """
+        收到一个解析后的流式 chunk 时调用，chunk 包含用量统计时填入计时结果
+        """
+        if chunk is None:
+            return
+        if any(has_output(choice.delta) for choice in chunk.choices):
+            self.tokens_received()
+            self.token_chunks += 1
+        if chunk.usage is not None:
+            self.usage_received(chunk.usage)
+
+    def usage_received(self, usage: ChatUsageModel | None):
+        """
+        记录上游返回的输出 token 数，并把计时结果填入上游没有返回（为空或为 0）的性能指标
+        """
+        if usage is None:
+            return
+        if usage.completion_tokens:
+            self.completion_tokens = usage.completion_tokens
+
+        time_to_first_token, time_per_output_token, tokens_per_second = self.get_latency()
+        if not usage.time_to_first_token_ms and time_to_first_token is not None:
+            usage.time_to_first_token_ms = round(time_to_first_token * 1000, 3)
+        if not usage.time_per_output_token_ms and time_per_output_token is not None:
+            usage.time_per_output_token_ms = round(time_per_output_token * 1000, 3)
+        if not usage.tokens_per_second and tokens_per_second is not None:
+            usage.tokens_per_second = round(tokens_per_second, 3)
+
+    def get_latency(self) -> tuple[float | None, float | None, float | None]:
+        """
+        Returns:
+            tuple[float | None, float | None, float | None]: 首 token 延迟（秒）、每个输出 token 的平均耗时（秒）、每秒输出 token 数，
+            还没有收到输出内容、输出 token 数不足以计算或者是非流式请求（首 token 延迟）时为 None
+        """
+        if self.first_token_time is None or self.last_token_time is None:
+            return None, None, None
+
+        output_tokens = self.completion_tokens or self.token_chunks
+        if self.stream:
+            time_to_first_token = self.first_token_time - self.start_time
+            # 第一个输出 token 之后还生成了 output_tokens - 1 个 token
+            output_tokens -= 1
+            duration = self.last_token_time - self.first_token_time
+        else:
+            time_to_first_token = None
+            duration = self.last_token_time - self.start_time
+        if output_tokens <= 0 or duration <= 0:
+            return time_to_first_token, None, None
+        return time_to_first_token, duration / output_tokens, output_tokens / duration
+
+    def finish(self):
+        """
+        响应正常结束后调用，导出计时结果，客户端断开或上游出错时不导出
+        """
+        if self.finished:
+            return
+        self.finished = True
+
+        time_to_first_token, time_per_output_token, tokens_per_second = self.get_latency()
+        labels = {
+            "endpoint": self.endpoint,
+            "model": get_model_label(self.endpoint, self.model),
+            "stream": "true" if self.stream else "false",
+        }
+        if time_to_first_token is not None:
+            time_to_first_token_seconds.observe(time_to_first_token, **labels)
+        if self.last_token_time is not None:
+            request_duration_seconds.observe(self.last_token_time - self.start_time, **labels)
+        if time_per_output_token is not None:
+            time_per_output_token_seconds.observe(time_per_output_token, **labels)
+        if tokens_per_second is not None:
+            output_tokens_per_second.observe(tokens_per_second, **labels)
@@ -0,0 +1,133 @@
+"""
+# 指标模块，以 Prometheus 文本格式通过 GET /metrics 导出
+
+from services.metrics_service import metrics
+
+pool_timeouts_total = metrics.counter("bee_http_pool_timeouts_total", "等待连接池超时的次数", ["client"])
+pool_timeouts_total.inc(client="chat")
+
+pool_wait_seconds = metrics.histogram("bee_http_pool_wait_seconds", "等待连接池分配连接的耗时（秒）", ["client"])
+pool_wait_seconds.observe(0.01, client="chat")
+
+指标保存在当前 worker 进程内，多 worker 时每个进程分别统计。
+"""
+
+import bisect
+
+# 默认的直方图分桶（秒）
+default_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escape_label_value(value: str) -> str:
+    """
+    按 Prometheus 文本格式转义标签值中的反斜杠、双引号和换行，避免标签值中的内容伪造出其他指标
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(label_names: list[str], label_values: tuple[str, ...]) -> str:
+    if len(label_names) == 0:
+        return ""
+    labels = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in zip(label_names, label_values))
+    return "{" + labels + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(value)
+
+
+class Counter:
+    """
+    只增不减的计数器
+    """
+
+    def __init__(self, name: str, description: str, label_names: list[str]):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        label_values = tuple(str(labels.get(name, "")) for name in self.label_names)
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    直方图，按分桶统计观测值的分布，同时记录观测值的总和与次数
+    """
+
+    def __init__(self, name: str, description: str, label_names: list[str], buckets: tuple[float, ...] = default_buckets):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数, 总和, 次数]，分桶计数不累加，导出时再累加
+        self.values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        label_values = tuple(str(labels.get(name, "")) for name in self.label_names)
+        data = self.values.get(label_values)
+        if data is None:
+            data = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self.values[label_values] = data
+        data[0][bisect.bisect_left(self.buckets, value)] += 1
+        data[1] += value
+        data[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, (bucket_counts, total, count) in self.values.items():
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                labels = format_labels(self.label_names + ["le"], label_values + (format_value(upper_bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    管理所有指标，同名指标只创建一次
+    """
+
+    def __init__(self):
+        self.metrics: dict[str, Counter | Histogram] = {}
+
+    def counter(self, name: str, description: str, label_names: list[str] | None = None) -> Counter:
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = Counter(name, description, label_names or [])
+            self.metrics[name] = metric
+        return metric  # type: ignore
+
+    def histogram(self,
+                  name: str,
+                  description: str,
+                  label_names: list[str] | None = None,
+                  buckets: tuple[float, ...] = default_buckets) -> Histogram:
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = Histogram(name, description, label_names or [], buckets)
+            self.metrics[name] = metric
+        return metric  # type: ignore
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
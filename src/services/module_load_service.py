@@ -1,9 +1,14 @@
+import asyncio
 import importlib
 from types import ModuleType
 
-from services import env_service
+from services import env_service, route_service
 from services.log_service import logger
 
+# 已加载并初始化的 provider 模块，键为“provider 名称:模块名称”，多个 provider 可以同时使用
+api_modules: dict[str, ModuleType] = {}
+api_modules_lock = asyncio.Lock()
+
 
 def load_api_provider_api(provider_name: str,method_name:str) -> ModuleType:
     """
@@ -27,27 +32,51 @@ def load_api_provider_api(provider_name: str,method_name:str) -> ModuleType:
     
     except Exception as e:
         raise RuntimeError(f"加载 {provider_name} 的 {method_name} 失败: {e}")
-    
-def load_rerank_api() -> ModuleType:
-    provider_name=env_service.get_provider_type()
-    return load_api_provider_api(provider_name,"rerank_api")
-    
-def load_embeddings_api() -> ModuleType:
-    provider_name=env_service.get_provider_type()
-    return load_api_provider_api(provider_name,"embeddings_api")
-    
-def load_chat_api() -> ModuleType:
-    provider_name=env_service.get_provider_type()
-    return load_api_provider_api(provider_name,"chat_api")
 
-def load_ocr_api() -> ModuleType:
-    provider_name=env_service.get_provider_type()
-    return load_api_provider_api(provider_name,"ocr_api")
+def get_provider_name(endpoint: str, model: str | None = None) -> str:
+    """
+    获取接口或模型使用的 provider 名称，优先级：路由表中模型配置的 provider > bee_{接口}_provider_type > bee_provider_type
+
+    Args:
+        endpoint (str): 接口名称，如 chat、embeddings、asr
+        model (str | None): 模型名称
+    """
+    route = route_service.get_route(endpoint, model)
+    if route is not None and route.provider:
+        return route.provider
+    return env_service.get_endpoint_provider_type(endpoint)
+
+def has_api_module(endpoint: str, model: str | None = None, provider_endpoint: str | None = None) -> bool:
+    """
+    判断接口或模型使用的 provider 是否实现了该接口，如 baidu_paddleocr_vl 只实现了 ocr_api
+    """
+    provider_module = importlib.import_module(f"api_providers.{get_provider_name(provider_endpoint or endpoint, model)}")
+    return hasattr(provider_module, f"{endpoint}_api")
 
-def load_asr_api() -> ModuleType:
-    provider_name=env_service.get_provider_type()
-    return load_api_provider_api(provider_name,"asr_api")
+async def get_api_module(endpoint: str, model: str | None = None, provider_endpoint: str | None = None) -> ModuleType:
+    """
+    获取接口或模型使用的 provider 模块，首次使用时加载并调用模块的 init 函数
+
+    Args:
+        endpoint (str): 模块对应的接口名称，如 chat、embeddings
+        model (str | None): 模型名称
+        provider_endpoint (str | None): 按哪个接口的配置选择 provider，为空时与 endpoint 相同。
+            asr、tts 使用 provider 的 chat_api 模块，配置了各自的上游地址时按 asr、tts 的配置选择 provider
+
+    Returns:
+        ModuleType: provider 中对应接口的模块，如 api_providers.gpustack.chat_api
+    """
+    provider_name = get_provider_name(provider_endpoint or endpoint, model)
+    method_name = f"{endpoint}_api"
+    key = f"{provider_name}:{method_name}"
+    api_module = api_modules.get(key)
+    if api_module is not None:
+        return api_module
 
-def load_tts_api() -> ModuleType:
-    provider_name=env_service.get_provider_type()
-    return load_api_provider_api(provider_name,"tts_api")
\ No newline at end of file
+    async with api_modules_lock:
+        api_module = api_modules.get(key)
+        if api_module is None:
+            api_module = load_api_provider_api(provider_name, method_name)
+            await api_module.init() # type: ignore
+            api_modules[key] = api_module
+    return api_module
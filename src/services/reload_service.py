@@ -0,0 +1,125 @@
+"""
+# 配置热更新模块，监听 .env 文件和路由表文件，文件变化后重新创建上游地址池，不需要重启服务
+
+每个 worker 进程各自监听文件并替换自己的地址池，进行中的请求在旧地址池上正常结束。
+
+from services.reload_service import config_reloader
+
+await config_reloader.startup()
+await config_reloader.shutdown()
+
+# 手动触发一次热更新，之后为新的上游地址预热连接
+config_reloader.reload()
+await connection_warmer.prepare()
+"""
+
+import asyncio
+import os
+
+from dotenv import dotenv_values, find_dotenv
+from watchfiles import awatch
+
+from services import env_service, route_service
+from services.log_service import logger
+from services.upstream_service import upstream_pools
+from services.warmup_service import connection_warmer
+
+
+class ConfigReloader:
+    """
+    监听配置文件变化并热更新上游地址池
+    """
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.stop_event: asyncio.Event | None = None
+        self.env_path = ""
+        # 上一次读取的 .env 文件内容，用于判断哪些环境变量发生了变化
+        self.env_values: dict[str, str | None] = {}
+
+    async def startup(self):
+        self.env_path = find_dotenv(usecwd=True)
+        if self.env_path:
+            self.env_values = dotenv_values(self.env_path)
+
+        if env_service.get_config_watch() != "true":
+            logger.info("未开启配置文件热更新")
+            return
+
+        self.stop_event = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def shutdown(self):
+        if self.stop_event:
+            self.stop_event.set()
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get_watch_paths(self) -> set[str]:
+        """
+        获取需要监听的文件：.env 文件，以及 bee_route_config 配置为文件路径时的路由表文件
+        """
+        watch_paths: set[str] = set()
+        if self.env_path:
+            watch_paths.add(os.path.abspath(self.env_path))
+
+        route_config = env_service.get_route_config().strip()
+        if route_config != "" and not route_config.startswith("{"):
+            watch_paths.add(os.path.abspath(route_config))
+        return watch_paths
+
+    async def run(self):
+        while self.stop_event is not None and not self.stop_event.is_set():
+            watch_paths = self.get_watch_paths()
+            # 监听文件所在的目录，编辑器保存时先写临时文件再重命名的方式也能被监听到
+            watch_dirs = {os.path.dirname(path) for path in watch_paths if os.path.isdir(os.path.dirname(path))}
+            if len(watch_dirs) == 0:
+                logger.info("没有需要监听的配置文件，未开启配置文件热更新")
+                return
+
+            logger.info(f"开启配置文件热更新，监听文件：{sorted(watch_paths)}")
+            async for _ in awatch(*watch_dirs,
+                                  watch_filter=lambda _, path: os.path.abspath(path) in watch_paths,
+                                  stop_event=self.stop_event,
+                                  recursive=False):
+                try:
+                    self.reload()
+                    await connection_warmer.prepare()
+                except Exception as e:
+                    logger.error(f"配置文件热更新失败，继续使用原有配置，异常类型：{str(type(e))},异常信息：{e}")
+                # 路由表文件路径发生变化时重新开始监听
+                if self.get_watch_paths() != watch_paths:
+                    break
+
+    def reload_env(self) -> None:
+        """
+        重新读取 .env 文件，只更新发生了变化的环境变量，没有变化的环境变量仍以启动时的进程环境变量为准
+        """
+        if not self.env_path or not os.path.exists(self.env_path):
+            return
+
+        env_values = dotenv_values(self.env_path)
+        for name, value in env_values.items():
+            if value is not None and self.env_values.get(name) != value:
+                os.environ[name] = value
+        for name, value in self.env_values.items():
+            if name not in env_values and os.environ.get(name) == value:
+                del os.environ[name]
+        self.env_values = env_values
+
+    def reload(self) -> None:
+        """
+        重新读取 .env 文件和路由表，并替换所有上游地址池，路由表读取失败时抛出异常并保留原有地址池
+        """
+        logger.info("重新加载配置")
+        self.reload_env()
+        route_service.reload_routes()
+        upstream_pools.reload()
+
+
+config_reloader = ConfigReloader()
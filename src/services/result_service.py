@@ -0,0 +1,99 @@
+"""
+# 返回结果模块，provider 按 bee_trust_upstream 决定是否校验上游返回的内容，
+# 接口直接用 orjson 序列化结果，不再经过 FastAPI 按 response_model 重新校验和 jsonable_encoder 转换
+
+from services.result_service import build_result, to_json_response
+
+result_obj = build_result(BeeEmbeddingsResult, result_dict)
+return to_json_response(result_obj)
+"""
+
+import functools
+import types
+from collections.abc import Callable
+from typing import Any, TypeVar, Union, get_args, get_origin
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from services import env_service
+
+T = TypeVar("T", bound=BaseModel)
+
+
+def build_result(model_class: type[T], data: dict) -> T:
+    """
+    把上游返回的内容转换为结果对象。
+
+    默认完整校验；bee_trust_upstream=true 时认为上游返回的内容符合格式，使用 model_construct 直接构建，
+    不检查、不转换字段类型，向量等大数组不再逐个元素校验。
+
+    Args:
+        model_class (type[T]): 结果类型，如 BeeEmbeddingsResult
+        data (dict): 上游返回的内容
+
+    Returns:
+        T: 结果对象
+    """
+    if env_service.get_trust_upstream() == "true":
+        return construct_model(model_class, data)
+    return model_class(**data)
+
+
+def construct_model(model_class: type[T], data: dict) -> T:
+    """
+    不校验地构建模型，嵌套的模型字段同样构建为模型对象，provider 和后续处理可以照常按属性访问
+    """
+    values = dict(data)
+    for name, build in get_nested_builders(model_class).items():
+        value = values.get(name)
+        if value is not None:
+            values[name] = build(value)
+    return model_class.model_construct(**values)
+
+
+@functools.cache
+def get_nested_builders(model_class: type[BaseModel]) -> dict[str, Callable[[Any], Any]]:
+    """
+    模型中需要递归构建的字段，按模型类型缓存
+    """
+    builders: dict[str, Callable[[Any], Any]] = {}
+    for name, field in model_class.model_fields.items():
+        build = get_builder(field.annotation)
+        if build is not None:
+            builders[name] = build
+    return builders
+
+
+def get_builder(annotation: Any) -> Callable[[Any], Any] | None:
+    """
+    按字段类型返回构建函数，支持模型、模型列表以及可以为 None 的模型，其他类型原样保留返回 None
+    """
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        model_class = annotation
+        return lambda value: construct_model(model_class, value) if isinstance(value, dict) else value
+
+    origin = get_origin(annotation)
+    if origin is Union or origin is types.UnionType:
+        builders = [build for build in map(get_builder, get_args(annotation)) if build is not None]
+        return builders[0] if len(builders) == 1 else None
+
+    if origin is list:
+        args = get_args(annotation)
+        item_build = get_builder(args[0]) if args else None
+        if item_build is not None:
+            return lambda value: [item_build(item) for item in value] if isinstance(value, list) else value
+    return None
+
+
+def to_json_response(result: BaseModel) -> Response:
+    """
+    用 orjson 序列化结果对象。
+
+    路由函数返回 Response 时 FastAPI 不再按 response_model 重新校验结果，也不再用 jsonable_encoder 逐个转换元素，
+    结果对象已经是 response_model 中声明的类型，返回的内容与原来一致。
+    """
+    # 不校验构建的结果中字段类型可能与声明不一致，不输出序列化警告
+    content = orjson.dumps(result.model_dump(warnings=False))
+    return Response(content=content, media_type="application/json")
@@ -0,0 +1,233 @@
+"""
+# 重试模块，幂等请求（向量、重排、文字识别、非流式对话）在上游地址不可用时换一个地址重试
+
+from services import retry_service
+
+response = await retry_service.post_with_retry(upstream_pool, client, url, headers, json_data)
+
+# 流式对话在收到第一段内容之前失败时同样换一个地址重试，返回上游响应的字节内容，由 sse_service.SSEDecoder 切分事件
+async with aclosing(retry_service.aiter_bytes_with_retry(upstream_pool, client, url, headers, json_data)) as chunks:
+    async for chunk in chunks:
+        ...
+"""
+
+import time
+from collections.abc import AsyncIterator, Callable
+
+import httpx
+
+from services import env_service
+from services.log_service import logger
+from services.upstream_service import UpstreamPool
+
+
+class RetryBudget:
+    """
+    令牌桶形式的重试预算。
+
+    每个请求存入 ratio 个令牌，每次重试取出 1 个令牌，令牌不足时不再重试，
+    保证重试请求最多占正常请求的 ratio 比例，上游整体故障时不会被重试请求进一步放大；
+    另外每秒补充 min_per_second 个令牌，保证低流量时也能重试。
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, max_tokens: float = 100):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = min_per_second
+        self.last_refill_time = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.last_refill_time) * self.min_per_second)
+        self.last_refill_time = now
+
+    def deposit(self) -> None:
+        """
+        记录一次正常请求
+        """
+        self.refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        """
+        尝试取出一次重试的令牌
+
+        Returns:
+            bool: 是否允许重试
+        """
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+retry_budgets: dict[str, RetryBudget] = {}
+
+
+def get_retry_budget(pool_name: str) -> RetryBudget:
+    retry_budget = retry_budgets.get(pool_name)
+    if retry_budget is None:
+        retry_budget = RetryBudget(float(env_service.get_retry_budget_ratio()),
+                                   float(env_service.get_retry_budget_min_per_second()))
+        retry_budgets[pool_name] = retry_budget
+    return retry_budget
+
+
+def is_retryable(e: Exception) -> bool:
+    """
+    判断请求失败后是否可以换一个上游地址重试。
+
+    只重试确定上游没有处理请求的情况：建立连接失败，或者上游返回 502、503。
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in (502, 503)
+    return isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def is_stream_retryable(e: Exception) -> bool:
+    """
+    判断流式请求在收到第一个事件之前失败后是否可以换一个上游地址重试。
+
+    此时还没有向客户端返回任何内容，5xx 状态码以及连接、读取过程中的网络错误都可以重试；
+    等待连接池超时说明本地连接池已满，换地址也要等待同一个连接池，不重试。
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    if isinstance(e, httpx.PoolTimeout):
+        return False
+    return isinstance(e, httpx.TransportError)
+
+
+def get_retry_url(upstream_pool: UpstreamPool,
+                  e: Exception,
+                  attempt: int,
+                  tried_urls: set[str],
+                  retryable: Callable[[Exception], bool] = is_retryable) -> str | None:
+    """
+    判断失败的请求能否重试，能重试时返回下一次请求使用的上游地址。
+
+    Args:
+        upstream_pool (UpstreamPool): 请求所属的上游地址池
+        e (Exception): 本次请求的异常
+        attempt (int): 已经尝试的次数
+        tried_urls (set[str]): 已经尝试过的上游地址
+        retryable (Callable[[Exception], bool]): 判断异常是否可以重试的函数
+
+    Returns:
+        str | None: 下一次请求的上游地址，不能重试时返回 None
+    """
+    if not retryable(e):
+        return None
+
+    if attempt >= int(env_service.get_retry_max_attempts()):
+        return None
+
+    # provider 自行拼接的地址不在地址池中，无法换地址重试
+    if not tried_urls.issubset(upstream_pool.upstreams.keys()):
+        return None
+
+    if len(tried_urls) >= len(upstream_pool.upstreams):
+        return None
+
+    if not get_retry_budget(upstream_pool.name).try_withdraw():
+        logger.warning(f"{upstream_pool.name} 重试预算已用完，不再重试")
+        return None
+
+    return upstream_pool.select(exclude=tried_urls)
+
+
+async def post_with_retry(upstream_pool: UpstreamPool,
+                          client: httpx.AsyncClient,
+                          url: str,
+                          headers: dict,
+                          json_data: dict,
+                          count_request: bool = True) -> httpx.Response:
+    """
+    发起 POST 请求，上游地址连接失败或返回 502、503 时换一个地址重试。
+
+    Args:
+        upstream_pool (UpstreamPool): 请求所属的上游地址池
+        client (httpx.AsyncClient): 发起请求的客户端
+        url (str): 第一次请求的上游地址
+        headers (dict): 请求头
+        json_data (dict): 请求参数
+        count_request (bool): 是否把本次请求计入重试预算，对冲请求等额外请求不计入
+
+    Returns:
+        httpx.Response: 状态码正常的响应
+
+    Raises:
+        Exception: 不能再重试时抛出最后一次请求的异常，状态码异常时为 httpx.HTTPStatusError
+    """
+    if count_request:
+        get_retry_budget(upstream_pool.name).deposit()
+    tried_urls: set[str] = set()
+    attempt = 0
+    while True:
+        attempt += 1
+        tried_urls.add(url)
+        try:
+            with upstream_pool.track(url):
+                response = await client.post(url=url, headers=headers, json=json_data)
+                response.raise_for_status()
+            return response
+        except Exception as e:
+            retry_url = get_retry_url(upstream_pool, e, attempt, tried_urls)
+            if retry_url is None:
+                raise
+            logger.warning(f"请求上游地址 {url} 失败，异常类型：{str(type(e))},异常信息：{e}，第 {attempt + 1} 次尝试改用地址 {retry_url}")
+            url = retry_url
+
+
+
+async def aiter_bytes_with_retry(upstream_pool: UpstreamPool,
+                                 client: httpx.AsyncClient,
+                                 url: str,
+                                 headers: dict,
+                                 json_data: dict) -> AsyncIterator[bytes]:
+    """
+    发起流式 POST 请求并原样返回上游响应的字节内容，需要解析 SSE 事件时使用 sse_service.SSEDecoder。
+
+    收到第一段内容之前上游返回 5xx 状态码或者发生网络错误时，客户端还没有收到任何内容，换一个地址重试；
+    收到第一段内容之后的错误直接抛出。调用方需要用 contextlib.aclosing 包裹，保证提前结束时及时关闭上游连接。
+
+    Args:
+        upstream_pool (UpstreamPool): 请求所属的上游地址池
+        client (httpx.AsyncClient): 发起请求的客户端
+        url (str): 第一次请求的上游地址
+        headers (dict): 请求头
+        json_data (dict): 请求参数
+
+    Raises:
+        httpx.HTTPStatusError: 上游返回的状态码异常且不能再重试，响应内容已读取
+    """
+    get_retry_budget(upstream_pool.name).deposit()
+    # SSE 请求头
+    headers = {**headers, "Accept": "text/event-stream", "Cache-Control": "no-store"}
+    tried_urls: set[str] = set()
+    attempt = 0
+    while True:
+        attempt += 1
+        tried_urls.add(url)
+        chunk_received = False
+        try:
+            with upstream_pool.track(url):
+                async with client.stream("POST", url=url, headers=headers, json=json_data) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        response.raise_for_status()
+
+                    async for chunk in response.aiter_bytes():
+                        chunk_received = True
+                        yield chunk
+            return
+        except Exception as e:
+            if chunk_received:
+                raise
+            retry_url = get_retry_url(upstream_pool, e, attempt, tried_urls, is_stream_retryable)
+            if retry_url is None:
+                raise
+            logger.warning(f"流式请求上游地址 {url} 失败，异常类型：{str(type(e))},异常信息：{e}，第 {attempt + 1} 次尝试改用地址 {retry_url}")
+            url = retry_url
@@ -0,0 +1,171 @@
+"""
+# 路由表模块，为指定模型配置单独的上游地址池
+
+通过环境变量 bee_route_config 配置，可以是 JSON 字符串，也可以是 JSON 文件路径，格式如下：
+
+{
+    "chat": {
+        "qwen3-32b": {
+            "urls": "http://10.0.0.1/v1/chat/completions;http://10.0.0.2/v1/chat/completions",
+            "provider": "huawei_ascend",
+            "policy": "least_outstanding",
+            "max_connections": 200
+        }
+    },
+    "embeddings": {
+        "bge-m3": {
+            "urls": ["http://10.0.0.3/v1/embeddings"]
+        }
+    }
+}
+
+第一层为接口名称（chat、embeddings、rerank、ocr、asr、tts），第二层为模型名称，
+没有配置路由的模型使用接口默认的 bee_*_url 地址池。
+
+from services import route_service
+
+route = route_service.get_route("chat", "qwen3-32b")
+"""
+
+import json
+import os
+
+from pydantic import BaseModel, Field, field_validator
+
+from services import env_service
+from services.log_service import logger
+
+
+class RouteModel(BaseModel):
+    """
+    单个模型的路由配置
+    """
+
+    urls: list[str] = Field(
+        ...,
+        description="上游地址列表，也可以是英文分号 ; 分隔的字符串",
+        min_length=1
+    )
+    provider: str | None = Field(
+        None,
+        description="该模型使用的 provider，为空时使用接口的默认 provider"
+    )
+    policy: str | None = Field(
+        None,
+        description="上游地址选择策略，为空时使用接口的默认策略"
+    )
+    max_connections: int | None = Field(
+        None,
+        description="该模型的最大连接数，配置后使用单独的连接池"
+    )
+    max_keepalive_connections: int | None = Field(
+        None,
+        description="该模型的最大空闲保持连接数，配置后使用单独的连接池"
+    )
+    keepalive_expiry: float | None = Field(
+        None,
+        description="该模型的空闲连接保持时间（秒），配置后使用单独的连接池"
+    )
+    http2: str | None = Field(
+        None,
+        description="该模型的 HTTP/2 模式：false、true 或 h2c，配置后使用单独的连接池"
+    )
+
+    @field_validator("urls", mode="before")
+    @classmethod
+    def split_urls(cls, value):
+        if isinstance(value, str):
+            return [url.strip() for url in value.split(";") if url.strip()]
+        return value
+
+
+def load_routes() -> dict[str, dict[str, RouteModel]]:
+    """
+    读取 bee_route_config 配置的路由表
+
+    Returns:
+        dict[str, dict[str, RouteModel]]: 接口名称 -> 模型名称 -> 路由配置
+    """
+    route_config = env_service.get_route_config().strip()
+    if route_config == "":
+        return {}
+
+    if route_config.startswith("{"):
+        raw_routes = json.loads(route_config)
+    else:
+        if not os.path.exists(route_config):
+            raise FileNotFoundError(f"路由表文件 {route_config} 不存在")
+        with open(route_config, "r", encoding="utf-8") as route_file:
+            raw_routes = json.load(route_file)
+
+    routes: dict[str, dict[str, RouteModel]] = {}
+    for endpoint, model_routes in raw_routes.items():
+        routes[endpoint] = {model: RouteModel(**route) for model, route in model_routes.items()}
+        logger.info(f"加载 {endpoint} 路由表，模型：{list(routes[endpoint].keys())}")
+    return routes
+
+
+# bee_route_config 中配置的路由表，首次使用时读取，热更新时整体替换
+routes: dict[str, dict[str, RouteModel]] | None = None
+# provider 在代码中补充的路由，优先级低于 bee_route_config
+default_routes: dict[str, dict[str, RouteModel]] = {}
+
+
+def get_config_routes() -> dict[str, dict[str, RouteModel]]:
+    global routes
+    if routes is None:
+        routes = load_routes()
+    return routes
+
+
+def reload_routes() -> None:
+    """
+    重新读取 bee_route_config，读取或解析失败时抛出异常并保留原有路由表
+    """
+    global routes
+    routes = load_routes()
+
+
+def get_routes() -> dict[str, dict[str, RouteModel]]:
+    """
+    获取所有路由，包括 bee_route_config 中配置的路由和 provider 补充的路由
+
+    Returns:
+        dict[str, dict[str, RouteModel]]: 接口名称 -> 模型名称 -> 路由配置
+    """
+    all_routes = {endpoint: dict(model_routes) for endpoint, model_routes in default_routes.items()}
+    for endpoint, model_routes in get_config_routes().items():
+        all_routes.setdefault(endpoint, {}).update(model_routes)
+    return all_routes
+
+
+def get_route(endpoint: str, model: str | None) -> RouteModel | None:
+    """
+    获取模型的路由配置
+
+    Args:
+        endpoint (str): 接口名称，如 chat、embeddings
+        model (str | None): 模型名称
+
+    Returns:
+        RouteModel | None: 路由配置，模型没有配置路由时返回 None
+    """
+    if not model:
+        return None
+    route = get_config_routes().get(endpoint, {}).get(model)
+    if route is None:
+        route = default_routes.get(endpoint, {}).get(model)
+    return route
+
+
+def add_route(endpoint: str, model: str, urls: str | list[str]) -> None:
+    """
+    在代码中为模型补充路由，用于兼容 provider 原有的按模型区分地址的环境变量，
+    bee_route_config 中配置了同一模型时以 bee_route_config 为准。
+
+    Args:
+        endpoint (str): 接口名称
+        model (str): 模型名称
+        urls (str | list[str]): 上游地址列表，或英文分号 ; 分隔的字符串
+    """
+    default_routes.setdefault(endpoint, {})[model] = RouteModel(urls=urls)
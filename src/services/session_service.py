@@ -0,0 +1,90 @@
+"""
+# 会话粘滞模块，同一会话的多轮对话在一段时间内固定路由到同一个上游地址，保持该会话的 KV cache 在同一节点上
+
+from services import session_service
+
+# 在路由中读取会话标识请求头
+session_id: str | None = Depends(session_service.get_session_id)
+
+# 在选择上游地址期间设置当前请求的会话标识，upstream_pools.select 会优先使用该会话上次的地址
+with session_service.session_scope(session_id):
+    request_url = await chat_api.get_request_url(args)
+"""
+
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from fastapi import Request
+
+from services import env_service
+
+# 当前请求的会话标识，只在选择上游地址期间有值
+session_id_var: ContextVar[str | None] = ContextVar("session_id", default=None)
+
+
+def get_session_id(request: Request) -> str | None:
+    """
+    读取请求头中的会话标识，请求头名称通过 bee_session_header 配置
+    """
+    session_id = request.headers.get(env_service.get_session_header())
+    if not session_id:
+        return None
+    return session_id
+
+
+@contextmanager
+def session_scope(session_id: str | None) -> Iterator[None]:
+    token = session_id_var.set(session_id)
+    try:
+        yield
+    finally:
+        session_id_var.reset(token)
+
+
+class StickySessions:
+    """
+    会话与上游地址的对应关系，按最近使用顺序保存，超过最大会话数时淘汰最久未使用的会话，
+    会话超过 ttl_seconds 没有新的请求时失效
+    """
+
+    def __init__(self, ttl_seconds: float, max_sessions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        # 键为“地址池名称 会话标识”，值为（上游地址，过期时间）
+        self.sessions: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_sessions > 0
+
+    def get(self, pool_name: str, session_id: str) -> str | None:
+        """
+        获取会话上次使用的上游地址，会话不存在或已过期时返回 None
+        """
+        key = f"{pool_name} {session_id}"
+        session = self.sessions.get(key)
+        if session is None:
+            return None
+
+        url, expire_at = session
+        if time.monotonic() >= expire_at:
+            del self.sessions[key]
+            return None
+        return url
+
+    def set(self, pool_name: str, session_id: str, url: str) -> None:
+        """
+        记录会话本次使用的上游地址，并刷新会话的过期时间
+        """
+        key = f"{pool_name} {session_id}"
+        self.sessions[key] = (url, time.monotonic() + self.ttl_seconds)
+        self.sessions.move_to_end(key)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+
+sticky_sessions = StickySessions(float(env_service.get_sticky_session_ttl()),
+                                 int(env_service.get_sticky_session_max()))
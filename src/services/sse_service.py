@@ -21,4 +21,95 @@ def get_sse_message(
 
     data_part = f"data: {message}\n"
     message_body = f"{data_part}\n"
-    return message_body
\ No newline at end of file
+    return message_body
+
+# 流式对话结束时的 SSE 消息
+sse_done_message = b"data: [DONE]\n\n"
+
+
+def encode_sse_data(data: bytes) -> bytes:
+    """
+    生成一条只有 data 字段的 SSE 消息，与 get_sse_message 相同，但直接处理字节，只分配一次内存。
+
+    Args:
+        data (bytes): 消息内容，不能包含换行符，如 JSON 序列化后的内容
+
+    Returns:
+        bytes: 以 ``\\n\\n`` 结尾的 SSE 消息
+    """
+    return b"data: %b\n\n" % data
+
+
+class SSEDecoder:
+    """
+    增量解析 SSE 字节流，按空行切分事件，只返回事件中 data 字段的内容，用于替代 httpx_sse 逐行解码为字符串的方式。
+
+    大多数事件只有一行 ``data: ...``，直接从缓冲区切出 data 的内容，不拆分行、不解码为字符串；
+    注释（如心跳 ``: ping``）以及没有 data 字段的事件会被忽略。流结束时不完整的事件按 SSE 规范丢弃。
+    换行符支持 ``\\r\\n``、``\\n`` 以及单独的 ``\\r``，与 httpx_sse 一致。
+
+    decoder = SSEDecoder()
+    async for chunk in response.aiter_bytes():
+        for data in decoder.feed(chunk):
+            result = json.loads(data)
+    """
+
+    def __init__(self):
+        # 尚未组成完整事件的内容，换行符已经统一为 \n
+        self.buffer = b""
+        # 上一段内容以 \r 结尾，下一段开头的 \n 与它组成 \r\n，应当跳过
+        self.skip_lf = False
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """
+        追加一段字节内容，返回其中已经完整的事件的 data 内容
+
+        Args:
+            chunk (bytes): 上游响应的一段字节内容，可以在任意位置截断
+
+        Returns:
+            list[bytes]: 完整事件的 data 内容，多行 data 以换行符连接
+        """
+        if self.skip_lf and chunk:
+            self.skip_lf = False
+            if chunk.startswith(b"\n"):
+                chunk = chunk[1:]
+        if b"\r" in chunk:
+            # SSE 的换行符可以是 \r\n、\n 或单独的 \r，统一为 \n；
+            # 末尾的 \r 直接作为换行符处理，不等待下一段内容，下一段开头的 \n 再跳过
+            self.skip_lf = chunk.endswith(b"\r")
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        buffer = self.buffer + chunk if self.buffer else chunk
+
+        events: list[bytes] = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n\n", start)
+            if end == -1:
+                break
+
+            # 只有一行 data 的事件直接切出内容
+            if buffer.startswith(b"data: ", start) and buffer.find(b"\n", start, end) == -1:
+                events.append(buffer[start + 6:end])
+            else:
+                data = self.get_data(buffer[start:end])
+                if data is not None:
+                    events.append(data)
+            start = end + 2
+
+        self.buffer = buffer[start:] if start else buffer
+        return events
+
+    @staticmethod
+    def get_data(event: bytes) -> bytes | None:
+        """
+        读取多行事件中所有 data 字段的内容，没有 data 字段时返回 None
+        """
+        data_lines: list[bytes] = []
+        for line in event.split(b"\n"):
+            if line.startswith(b"data:"):
+                value = line[5:]
+                data_lines.append(value[1:] if value.startswith(b" ") else value)
+        if len(data_lines) == 0:
+            return None
+        return b"\n".join(data_lines)
@@ -0,0 +1,597 @@
+"""
+# 上游地址池模块，统一管理各接口配置的上游地址，并负责选择本次请求使用的地址
+
+from services.upstream_service import upstream_pools
+
+# 在 provider 中选择上游地址，路由表中配置了该模型时使用模型单独的地址池
+url=upstream_pools.select("chat", args.model)
+
+# 在发起请求时统计进行中的请求数，请求抛出的连接错误、超时、5xx 等异常会计入熔断统计
+with upstream_pools.get_pool("chat", args.model).track(url):
+    response = await client.post(url=url, ...)
+    response.raise_for_status()
+"""
+
+import bisect
+import hashlib
+import math
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+import httpx
+
+from services import env_service, route_service, session_service
+from services.log_service import logger
+
+# ewma 策略下失败的请求按该耗时（毫秒）计入平均值，避免快速失败的地址反而显得最快
+ewma_failure_penalty_ms = 1000
+# ewma 策略下平均耗时随空闲时间衰减的时间常数（秒），长时间没有被选中的慢地址会重新得到试探的机会
+ewma_decay_seconds = 10
+
+# prefix_affinity 策略下每个地址在哈希环上的虚拟节点数，虚拟节点越多请求分布越均匀
+hash_ring_replicas = 100
+
+# 当前请求在 select 时占用了试探名额的半开地址，track 时据此判断本次请求是否为试探请求
+# 值为地址 -> 占用名额时得到的凭证，名额过期后被其他请求重新占用时凭证不同
+trial_claims_var: ContextVar[dict["Upstream", object]] = ContextVar("breaker_trial_claims", default={})
+
+# 地址池名称与环境变量读取函数的对应关系
+pool_url_getters: dict[str, Callable[[], str]] = {
+    "chat": env_service.get_chat_url,
+    "embeddings": env_service.get_embeddings_url,
+    "rerank": env_service.get_rerank_url,
+    "ocr": env_service.get_ocr_url,
+    "asr": env_service.get_asr_url,
+    "tts": env_service.get_tts_url,
+}
+
+
+def parse_urls(env_urls: str) -> list[str]:
+    """
+    解析英文分号 ; 分隔的地址列表，去除空白和空项，保持原有顺序并去重。
+
+    Args:
+        env_urls (str): 环境变量中配置的地址字符串
+
+    Returns:
+        list[str]: 地址列表
+    """
+    urls: list[str] = []
+    for url in env_urls.split(";"):
+        url = url.strip()
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def get_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def get_prefix_key(messages: list[Any], turns: int) -> str | None:
+    """
+    获取对话消息前缀的路由键：开头的系统消息加上之后的前 turns 条消息。
+
+    前缀相同的请求会路由到同一个上游地址，上游开启前缀缓存（prefix caching）时可以复用已经计算过的 KV cache。
+
+    Args:
+        messages (list[Any]): 对话消息列表，元素为 pydantic 消息对象
+        turns (int): 系统消息之后计入前缀的消息条数，0 表示只按系统消息路由
+
+    Returns:
+        str | None: 路由键，没有可用的前缀时返回 None
+    """
+    prefix: list[str] = []
+    for message in messages:
+        if message.role != "system":
+            if turns <= 0:
+                break
+            turns -= 1
+        prefix.append(message.model_dump_json(include={"role", "content"}))
+
+    if len(prefix) == 0:
+        return None
+    return "\n".join(prefix)
+
+
+def is_upstream_failure(e: Exception) -> bool:
+    """
+    判断异常是否说明上游地址本身不可用：连接错误、超时、连接中断或 5xx 状态码。
+
+    4xx 等状态码说明上游能正常处理请求，只是请求本身有问题，不计入失败；
+    等待连接池超时是本地连接池不够用，请求还没有发往上游，同样不计入失败。
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    if isinstance(e, httpx.PoolTimeout):
+        return False
+    return isinstance(e, httpx.TransportError)
+
+
+class Upstream:
+    """
+    单个上游地址的运行时状态
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        # 当前正在处理中的请求数
+        self.in_flight = 0
+        # 累计请求数
+        self.total_requests = 0
+        # 响应耗时的指数加权移动平均值（毫秒），还没有采样时为 None
+        self.ewma_latency_ms: float | None = None
+        self.ewma_updated_at = 0.0
+        # 健康检查结果，不健康的地址不参与选择
+        self.healthy = True
+        self.health_check_failures = 0
+        self.health_check_successes = 0
+        # 熔断状态：closed（正常）、open（熔断中）、half_open（放行一个试探请求）
+        self.breaker_state = "closed"
+        self.breaker_opened_at = 0.0
+        # 半开状态下唯一的试探名额是否已被占用，select 选中时占用，试探请求结束时由该请求释放
+        self.breaker_trial_in_flight = False
+        # 试探名额被占用的时间，试探请求开始后为 None
+        self.breaker_trial_claimed_at: float | None = None
+        # 占用试探名额的凭证
+        self.breaker_trial_token: object | None = None
+        # 真实请求连续失败次数
+        self.consecutive_failures = 0
+
+    def record_latency(self, latency_ms: float, alpha: float) -> None:
+        """
+        记录一次响应耗时，更新指数加权移动平均值。
+
+        Args:
+            latency_ms (float): 本次响应耗时（毫秒）
+            alpha (float): 平滑系数
+        """
+        if self.ewma_latency_ms is None:
+            self.ewma_latency_ms = latency_ms
+        else:
+            self.ewma_latency_ms = alpha * latency_ms + (1 - alpha) * self.ewma_latency_ms
+        self.ewma_updated_at = time.monotonic()
+
+    def record_health_check(self, success: bool, unhealthy_threshold: int, healthy_threshold: int) -> bool:
+        """
+        记录一次健康检查结果，连续失败达到阈值时标记为不健康，连续成功达到阈值时恢复。
+
+        Args:
+            success (bool): 本次健康检查是否成功
+            unhealthy_threshold (int): 标记为不健康需要的连续失败次数
+            healthy_threshold (int): 恢复为健康需要的连续成功次数
+
+        Returns:
+            bool: 健康状态是否发生了变化
+        """
+        if success:
+            self.health_check_failures = 0
+            self.health_check_successes += 1
+            if not self.healthy and self.health_check_successes >= healthy_threshold:
+                self.healthy = True
+                return True
+        else:
+            self.health_check_successes = 0
+            self.health_check_failures += 1
+            if self.healthy and self.health_check_failures >= unhealthy_threshold:
+                self.healthy = False
+                return True
+        return False
+
+    def is_available(self, open_seconds: float) -> bool:
+        """
+        判断当前是否可以向该地址分配请求，熔断时间到期后转为半开状态，只放行一个试探请求。
+
+        Args:
+            open_seconds (float): 熔断持续时间（秒）
+        """
+        if not self.healthy:
+            return False
+
+        if self.breaker_state == "open":
+            if time.monotonic() - self.breaker_opened_at < open_seconds:
+                return False
+            self.breaker_state = "half_open"
+            logger.info(f"上游地址 {self.url} 熔断到期，放行试探请求")
+
+        if self.breaker_state == "half_open":
+            if self.breaker_trial_claimed_at is not None and time.monotonic() - self.breaker_trial_claimed_at >= open_seconds:
+                # 被选中后一直没有发出的试探请求（如发出前出错）不再占用试探名额
+                self.release_trial()
+            return not self.breaker_trial_in_flight
+
+        return True
+
+    def claim_trial(self) -> object | None:
+        """
+        半开状态下占用唯一的试探名额，返回占用名额的凭证，名额已被占用或不是半开状态时返回 None
+        """
+        if self.breaker_state != "half_open" or self.breaker_trial_in_flight:
+            return None
+        self.breaker_trial_in_flight = True
+        self.breaker_trial_claimed_at = time.monotonic()
+        self.breaker_trial_token = object()
+        return self.breaker_trial_token
+
+    def release_trial(self) -> None:
+        self.breaker_trial_in_flight = False
+        self.breaker_trial_claimed_at = None
+        self.breaker_trial_token = None
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self.breaker_state != "closed":
+            self.breaker_state = "closed"
+            logger.info(f"上游地址 {self.url} 试探请求成功，恢复分配请求")
+
+    def record_failure(self, failure_threshold: int) -> None:
+        """
+        记录一次真实请求失败，连续失败达到阈值或半开状态下试探失败时进入熔断状态。
+
+        Args:
+            failure_threshold (int): 触发熔断需要的连续失败次数，0 表示不开启熔断
+        """
+        self.consecutive_failures += 1
+        if failure_threshold <= 0:
+            return
+
+        if self.breaker_state == "half_open" or (self.breaker_state == "closed" and self.consecutive_failures >= failure_threshold):
+            self.breaker_state = "open"
+            self.breaker_opened_at = time.monotonic()
+            logger.warning(f"上游地址 {self.url} 连续失败 {self.consecutive_failures} 次，暂停分配请求")
+
+    def get_cost(self) -> float:
+        """
+        按响应耗时估算把下一个请求交给该地址的代价，进行中请求越多、耗时越长代价越大。
+
+        还没有采样过的地址代价为 0，保证新地址能尽快被探测到；
+        平均耗时随距离上次采样的时间衰减，慢地址恢复后也能重新分到请求。
+        """
+        if self.ewma_latency_ms is None:
+            return 0
+        idle_seconds = time.monotonic() - self.ewma_updated_at
+        latency_ms = self.ewma_latency_ms * math.exp(-idle_seconds / ewma_decay_seconds)
+        return latency_ms * (self.in_flight + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "ewma_latency_ms": self.ewma_latency_ms,
+            "healthy": self.healthy,
+            "breaker_state": self.breaker_state,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class UpstreamPool:
+    """
+    一组可互相替代的上游地址，随机取两个候选地址（power of two choices）后按选择策略比较：
+
+    - least_outstanding：选择进行中请求数较少的地址
+    - ewma：选择响应耗时加权代价较小的地址，适用于向量、重排这类耗时稳定的短请求
+    - prefix_affinity：按对话前缀在一致性哈希环上选择地址，前缀相同的请求落到同一个地址，
+      地址的进行中请求数超过平均值的 load_factor 倍时顺延到环上的下一个地址（bounded load）；
+      没有路由键时按 least_outstanding 选择
+    """
+
+    def __init__(self,
+                 name: str,
+                 urls: list[str],
+                 endpoint: str | None = None,
+                 model: str | None = None,
+                 policy: str = "least_outstanding",
+                 ewma_alpha: float = 0.3,
+                 failure_threshold: int = 5,
+                 open_seconds: float = 10,
+                 load_factor: float = 1.25):
+        self.name = name
+        # 地址池所属的接口名称，模型单独的地址池名称为“接口名称:模型名称”
+        self.endpoint = endpoint or name
+        # 路由表中配置的模型名称，接口默认的地址池为 None
+        self.model = model
+        self.policy = policy
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.load_factor = load_factor
+        self.upstreams: dict[str, Upstream] = {url: Upstream(url) for url in urls}
+        # 一致性哈希环，按哈希值排序的（哈希值，地址）列表
+        self.ring: list[tuple[int, str]] = sorted(
+            (get_hash(f"{url}#{i}"), url) for url in urls for i in range(hash_ring_replicas))
+        self.ring_hashes = [ring_hash for ring_hash, _ in self.ring]
+
+    @property
+    def urls(self) -> list[str]:
+        return list(self.upstreams.keys())
+
+    def select(self, exclude: set[str] | None = None, key: str | None = None) -> str:
+        """
+        选择一个上游地址。
+
+        只在健康且未熔断的地址中选择，所有地址都不可用时退回到全部地址中选择，避免误判时整个接口不可用。
+        随机取两个候选地址，返回按选择策略比较后负载较低的一个，
+        既避免了随机选择把长请求堆到同一节点，也避免了所有请求同时涌向同一个“最空闲”节点。
+
+        Args:
+            exclude (set[str] | None): 本次不参与选择的地址
+            key (str | None): prefix_affinity 策略的路由键
+
+        Returns:
+            str: 上游地址
+        """
+        candidates = [upstream for upstream in self.upstreams.values()
+                      if not exclude or upstream.url not in exclude]
+
+        if len(candidates) == 0:
+            raise ValueError(f"{self.name} urls is empty")
+
+        available_candidates = [upstream for upstream in candidates if upstream.is_available(self.open_seconds)]
+        if len(available_candidates) > 0:
+            candidates = available_candidates
+
+        if len(candidates) == 1:
+            return self.claim(candidates[0])
+
+        if key is not None and self.policy == "prefix_affinity":
+            upstream = self.select_by_key(key, candidates)
+            if upstream is not None:
+                return self.claim(upstream)
+
+        first, second = random.sample(candidates, 2)
+        if self.policy == "ewma":
+            if second.get_cost() < first.get_cost():
+                return self.claim(second)
+            return self.claim(first)
+
+        if second.in_flight < first.in_flight:
+            return self.claim(second)
+        return self.claim(first)
+
+    def claim(self, upstream: Upstream) -> str:
+        """
+        选中半开状态的地址时在选择的同时占用试探名额，并记录在当前请求的上下文中，
+        只有占用了名额的请求在 track 结束时释放名额，并发的其他请求不会被当成试探请求。
+
+        Returns:
+            str: 上游地址
+        """
+        token = upstream.claim_trial()
+        if token is not None:
+            trial_claims_var.set({**trial_claims_var.get(), upstream: token})
+        return upstream.url
+
+    def reuse_upstreams(self, old_pool: "UpstreamPool") -> None:
+        """
+        热更新时沿用旧地址池中仍然保留的地址的运行时状态（进行中请求数、耗时、健康和熔断状态）
+        """
+        for url in self.upstreams:
+            upstream = old_pool.upstreams.get(url)
+            if upstream is not None:
+                self.upstreams[url] = upstream
+
+    def select_by_key(self, key: str, candidates: list[Upstream]) -> Upstream | None:
+        """
+        从路由键在哈希环上的位置开始顺时针查找，返回第一个负载没有超过上限的候选地址。
+
+        负载上限为 load_factor ×（候选地址进行中请求总数 + 1）/ 候选地址数，
+        热门前缀的请求过多时会顺延到环上的下一个地址，不会压垮单个节点。
+        """
+        candidate_upstreams = {upstream.url: upstream for upstream in candidates}
+        total_in_flight = sum(upstream.in_flight for upstream in candidates)
+        max_in_flight = math.ceil(self.load_factor * (total_in_flight + 1) / len(candidates))
+
+        start = bisect.bisect(self.ring_hashes, get_hash(key))
+        visited: set[str] = set()
+        for i in range(len(self.ring)):
+            url = self.ring[(start + i) % len(self.ring)][1]
+            upstream = candidate_upstreams.get(url)
+            if upstream is None or url in visited:
+                continue
+            if upstream.in_flight < max_in_flight:
+                return upstream
+            visited.add(url)
+            if len(visited) == len(candidate_upstreams):
+                break
+        return None
+
+    @contextmanager
+    def track(self, url: str) -> Iterator[Upstream | None]:
+        """
+        统计一次发往 url 的请求，请求期间该地址的进行中请求数加 1。
+
+        请求结束时根据结果更新熔断状态：连接错误、超时、5xx 计为失败，其他情况计为成功，
+        请求被取消（如客户端断开）时不计入统计；ewma 策略下请求正常结束时记录本次响应耗时。
+        不在地址池中的地址（如 provider 自行拼接的地址）不做统计。
+
+        Args:
+            url (str): 本次请求的上游地址
+        """
+        upstream = self.upstreams.get(url)
+        if upstream is None:
+            yield None
+            return
+
+        upstream.in_flight += 1
+        upstream.total_requests += 1
+        # 本次请求是否为 select 时占用了名额的试探请求
+        trial_claims = trial_claims_var.get()
+        token = trial_claims.get(upstream)
+        is_trial = token is not None and token is upstream.breaker_trial_token
+        if token is not None:
+            trial_claims_var.set({key: value for key, value in trial_claims.items() if key is not upstream})
+        if is_trial:
+            upstream.breaker_trial_claimed_at = None
+
+        # None 表示请求被取消
+        outcome: str | None = None
+        start_time = time.perf_counter()
+        try:
+            yield upstream
+            outcome = "success"
+        except Exception as e:
+            outcome = "failure" if is_upstream_failure(e) else "error"
+            raise
+        finally:
+            upstream.in_flight -= 1
+            if is_trial:
+                upstream.release_trial()
+            latency_ms = (time.perf_counter() - start_time) * 1000
+            if outcome == "failure":
+                upstream.record_failure(self.failure_threshold)
+                if self.policy == "ewma":
+                    upstream.record_latency(max(latency_ms, ewma_failure_penalty_ms), self.ewma_alpha)
+            elif outcome is not None:
+                upstream.record_success()
+                if outcome == "success" and self.policy == "ewma":
+                    upstream.record_latency(latency_ms, self.ewma_alpha)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "endpoint": self.endpoint,
+            "policy": self.policy,
+            "upstreams": [upstream.to_dict() for upstream in self.upstreams.values()],
+        }
+
+
+class UpstreamPoolManager:
+    """
+    管理所有接口的上游地址池，地址池在首次使用时根据环境变量和路由表创建：
+    路由表（bee_route_config）中配置了的模型使用单独的地址池，其他模型共用接口默认的 bee_*_url 地址池
+    """
+
+    def __init__(self):
+        self.pools: dict[str, UpstreamPool] = {}
+
+    def get_pool(self, endpoint: str, model: str | None = None) -> UpstreamPool:
+        """
+        获取接口或模型对应的地址池
+
+        Args:
+            endpoint (str): 接口名称，如 chat、embeddings
+            model (str | None): 模型名称，路由表中没有配置该模型时返回接口默认的地址池
+
+        Returns:
+            UpstreamPool: 上游地址池
+        """
+        route = route_service.get_route(endpoint, model)
+        name = endpoint if route is None else f"{endpoint}:{model}"
+        pool = self.pools.get(name)
+        if pool is not None:
+            return pool
+
+        pool = self.create_pool(endpoint, model)
+        self.pools[name] = pool
+        logger.info(f"{name} urls: {pool.urls}, policy: {pool.policy}")
+        return pool
+
+    def create_pool(self, endpoint: str, model: str | None) -> UpstreamPool:
+        """
+        根据当前的环境变量和路由表创建地址池，模型没有配置路由时创建接口默认的地址池
+        """
+        route = route_service.get_route(endpoint, model)
+        if route is None:
+            url_getter = pool_url_getters.get(endpoint)
+            if url_getter is None:
+                raise ValueError(f"未知的上游地址池：{endpoint}")
+            name = endpoint
+            model = None
+            urls = parse_urls(url_getter())
+            policy = env_service.get_upstream_policy(endpoint)
+        else:
+            name = f"{endpoint}:{model}"
+            urls = parse_urls(";".join(route.urls))
+            policy = route.policy or env_service.get_upstream_policy(endpoint)
+
+        return UpstreamPool(name,
+                            urls,
+                            endpoint=endpoint,
+                            model=model,
+                            policy=policy,
+                            ewma_alpha=float(env_service.get_upstream_ewma_alpha()),
+                            failure_threshold=int(env_service.get_circuit_breaker_failure_threshold()),
+                            open_seconds=float(env_service.get_circuit_breaker_open_seconds()),
+                            load_factor=float(env_service.get_prefix_affinity_load_factor()))
+
+    def is_configured(self, endpoint: str, model: str | None = None) -> bool:
+        """
+        判断接口或模型是否配置了上游地址：通过 bee_{接口}_url 环境变量或路由表
+        """
+        return route_service.get_route(endpoint, model) is not None or env_service.get_env(f"bee_{endpoint}_url") != ""
+
+    def select(self, endpoint: str, model: str | None = None, messages: list[Any] | None = None) -> str:
+        """
+        选择接口或模型的上游地址。
+
+        当前请求带有会话标识时优先使用该会话上次的地址（地址不可用时重新选择），
+        地址池使用 prefix_affinity 策略时按对话消息前缀选择。
+
+        Args:
+            endpoint (str): 接口名称，如 chat、embeddings
+            model (str | None): 模型名称
+            messages (list[Any] | None): 对话消息列表，只有对话接口需要传入
+        """
+        pool = self.get_pool(endpoint, model)
+
+        sticky_sessions = session_service.sticky_sessions
+        session_id = session_service.session_id_var.get() if sticky_sessions.enabled else None
+        if session_id is not None:
+            url = sticky_sessions.get(pool.name, session_id)
+            upstream = pool.upstreams.get(url) if url is not None else None
+            if upstream is not None and upstream.is_available(pool.open_seconds):
+                sticky_sessions.set(pool.name, session_id, url)
+                return pool.claim(upstream)
+
+        key = None
+        if messages and pool.policy == "prefix_affinity":
+            key = get_prefix_key(messages, int(env_service.get_prefix_affinity_turns()))
+        url = pool.select(key=key)
+
+        if session_id is not None:
+            sticky_sessions.set(pool.name, session_id, url)
+        return url
+
+    def load_configured_pools(self) -> None:
+        """
+        为已经通过环境变量或路由表配置了地址的接口和模型提前创建地址池，便于启动后立即开始健康检查
+        """
+        for name in pool_url_getters:
+            if self.is_configured(name):
+                self.get_pool(name)
+
+        for endpoint, model_routes in route_service.get_routes().items():
+            for model in model_routes:
+                self.get_pool(endpoint, model)
+
+    def reload(self) -> None:
+        """
+        根据最新的环境变量和路由表重建所有地址池，并整体替换。
+
+        仍然保留的地址沿用原有的运行时状态；进行中的请求持有旧地址池的引用，会在旧地址池上正常结束，
+        新请求从替换后的地址池中选择地址。路由表中删除的模型改用接口默认的地址池。
+        """
+        pools: dict[str, UpstreamPool] = {}
+        for old_pool in list(self.pools.values()):
+            if old_pool.model is not None and route_service.get_route(old_pool.endpoint, old_pool.model) is None:
+                logger.info(f"{old_pool.name} 的路由已删除，改用 {old_pool.endpoint} 默认的地址池")
+                continue
+
+            pool = self.create_pool(old_pool.endpoint, old_pool.model)
+            pool.reuse_upstreams(old_pool)
+            pools[pool.name] = pool
+            if pool.urls != old_pool.urls or pool.policy != old_pool.policy:
+                logger.info(f"{pool.name} urls: {pool.urls}, policy: {pool.policy}")
+
+        self.pools = pools
+        self.load_configured_pools()
+
+    def to_dict(self) -> dict:
+        return {name: pool.to_dict() for name, pool in self.pools.items()}
+
+
+upstream_pools = UpstreamPoolManager()
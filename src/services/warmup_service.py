@@ -0,0 +1,171 @@
+"""
+# 预热模块，在 main.py 的 lifespan 中提前加载 provider 并为每个上游地址建立保持连接，
+# 发布后的第一批请求不再承担模块加载和 TCP、TLS 握手的耗时
+
+from services.warmup_service import connection_warmer
+
+# 启动时，以及配置热更新后加载新的 provider 并为新的上游地址预热
+await connection_warmer.prepare()
+# 按健康检查的间隔定时重新预热，避免预热的连接在请求到达前因空闲超时被关闭
+await connection_warmer.startup()
+await connection_warmer.shutdown()
+"""
+
+import asyncio
+
+import httpx
+
+from services import env_service, route_service
+from services.health_check_service import get_health_check_url
+from services.http_service import http_clients
+from services.log_service import logger
+from services.module_load_service import get_api_module, has_api_module
+from services.upstream_service import upstream_pools
+
+# 实现了 provider 模块的接口，asr、tts 使用对话的 provider 模块
+api_module_endpoints = {
+    "chat": "chat",
+    "embeddings": "embeddings",
+    "rerank": "rerank",
+    "ocr": "ocr",
+    "asr": "chat",
+    "tts": "chat",
+}
+
+
+class ConnectionWarmer:
+    """
+    加载所有已配置的 provider 并调用 init，为每个上游地址并发发起若干个请求，建立的连接保留在连接池中供后续请求复用
+    """
+
+    def __init__(self):
+        # 首次预热是否已经完成
+        self.prepared = False
+        # 上游地址预热成功的连接数
+        self.warm_connections: dict[str, int] = {}
+        # 加载失败的 provider，键为“接口名称:模型名称”，值为异常信息
+        self.provider_errors: dict[str, str] = {}
+        self.task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        """
+        provider 全部加载成功且首次预热已经完成时可以接收请求。
+
+        上游地址不可用不影响就绪状态，所有 worker 共用同一批上游地址，由健康检查和熔断负责剔除。
+        """
+        return self.prepared and len(self.provider_errors) == 0
+
+    async def prepare(self):
+        # 先加载 provider，provider 的 init 可能会添加路由（如 huawei_ascend_match_2），之后再创建地址池
+        await self.load_providers()
+        upstream_pools.load_configured_pools()
+        await self.warm()
+        self.prepared = True
+
+    async def startup(self):
+        """
+        开启健康检查时，按健康检查的间隔通过请求使用的连接池重新预热。
+
+        空闲连接超过 bee_{接口}_keepalive_expiry 秒后会被连接池关闭，重新预热的请求优先复用空闲的预热连接并刷新其空闲时间，
+        保持时间大于该间隔时预热的连接可以一直保留到请求到达。
+        """
+        interval = float(env_service.get_health_check_interval())
+        if interval <= 0 or int(env_service.get_warmup_connections()) <= 0:
+            return
+        self.task = asyncio.create_task(self.keep_alive(interval))
+
+    async def shutdown(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def keep_alive(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.warm(refresh=True)
+            except Exception as e:
+                logger.error(f"保持预热连接发生错误，异常类型：{str(type(e))},异常信息：{e}")
+
+    async def load_providers(self):
+        """
+        加载各接口默认的 provider 以及路由表中为模型配置的 provider，provider 没有实现的接口跳过。
+        asr、tts 只在配置了各自的上游地址时按各自的配置加载，否则与对话使用同一个 provider
+        """
+        targets: set[tuple[str, str | None]] = {(endpoint, None) for endpoint in api_module_endpoints}
+        for endpoint, model_routes in route_service.get_routes().items():
+            for model in model_routes:
+                targets.add((endpoint, model))
+
+        provider_errors: dict[str, str] = {}
+        for endpoint, model in sorted(targets, key=lambda target: (target[0], target[1] or "")):
+            module_endpoint = api_module_endpoints.get(endpoint, endpoint)
+            if module_endpoint != endpoint and not upstream_pools.is_configured(endpoint, model):
+                continue
+            try:
+                if has_api_module(module_endpoint, model, endpoint):
+                    await get_api_module(module_endpoint, model, endpoint)
+            except Exception as e:
+                provider_errors[f"{endpoint}:{model}"] = f"{str(type(e))}: {e}"
+                logger.error(f"预加载 {endpoint} 接口模型 {model} 的 provider 失败，异常类型：{str(type(e))},异常信息：{e}")
+        self.provider_errors = provider_errors
+
+    async def warm(self, refresh: bool = False):
+        """
+        为所有地址池中的上游地址预热连接，同一个客户端的同一个地址只预热一次
+
+        Args:
+            refresh (bool): 是否为定时重新预热，重新预热成功时不输出 info 日志
+        """
+        count = int(env_service.get_warmup_connections())
+        if count <= 0:
+            return
+
+        timeout = float(env_service.get_warmup_timeout())
+        targets: dict[tuple[int, str], tuple[httpx.AsyncClient, str]] = {}
+        for pool in list(upstream_pools.pools.values()):
+            client = http_clients.get_client(pool.endpoint, pool.model)
+            for url in pool.urls:
+                targets[(id(client), url)] = (client, url)
+
+        await asyncio.gather(*(self.warm_upstream(client, url, count, timeout, refresh) for client, url in targets.values()))
+
+    async def warm_upstream(self, client: httpx.AsyncClient, url: str, count: int, timeout: float, refresh: bool = False):
+        """
+        对上游地址并发发起 count 个 GET 请求，建立 count 个保持连接。
+
+        上游接口通常只接受 POST 请求，GET 请求返回 404、405 等状态码同样能建立连接，
+        预热请求不计入上游地址的熔断统计。
+        """
+        warm_url = get_health_check_url(url)
+        results = await asyncio.gather(*(client.get(warm_url, timeout=timeout) for _ in range(count)),
+                                       return_exceptions=True)
+        success = sum(1 for result in results if isinstance(result, httpx.Response))
+        self.warm_connections[url] = success
+        if success < count:
+            errors = [result for result in results if isinstance(result, BaseException)]
+            logger.warning(f"上游地址 {url} 预热连接 {success}/{count} 个，异常类型：{str(type(errors[0]))},异常信息：{errors[0]}")
+        elif not refresh:
+            logger.info(f"上游地址 {url} 预热连接 {success} 个")
+
+    def to_dict(self) -> dict:
+        """
+        就绪状态以及每个上游地址的健康、熔断和预热连接数
+        """
+        pools = upstream_pools.to_dict()
+        for pool in pools.values():
+            for upstream in pool["upstreams"]:
+                upstream["warm_connections"] = self.warm_connections.get(upstream["url"], 0)
+        return {
+            "ready": self.ready,
+            "provider_errors": self.provider_errors,
+            "upstreams": pools,
+        }
+
+
+connection_warmer = ConnectionWarmer()